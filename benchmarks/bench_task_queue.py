@@ -0,0 +1,67 @@
+"""调度引擎基准测试：比较 heap（IndexedTaskQueue）与 wheel（MinuteBucketQueue）
+
+用法：python benchmarks/bench_task_queue.py [目标数量 ...]
+默认分别测试 10000 和 100000 个定时群。
+"""
+
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from task_queue import IndexedTaskQueue, MinuteBucketQueue  # noqa: E402
+
+
+def bench(queue_cls, targets, day_start):
+    """返回 (注册耗时, 单次重新调度耗时, 整天调度耗时, 唤醒次数)"""
+    random.seed(7)
+    queue = queue_cls()
+
+    started = time.perf_counter()
+    for target, minute in targets:
+        queue.push(target, day_start + timedelta(minutes=minute))
+    register = time.perf_counter() - started
+
+    # 模拟 /set_time：随机重新调度1000个目标
+    sample = random.sample(targets, 1000)
+    started = time.perf_counter()
+    for target, _ in sample:
+        queue.push(target, day_start + timedelta(minutes=random.randrange(1440)))
+    reschedule = (time.perf_counter() - started) / len(sample)
+
+    # 模拟一整天：每次唤醒取出到期任务并重新调度到第二天
+    wakeups = 0
+    started = time.perf_counter()
+    while True:
+        head = queue.peek()
+        if head is None or head[0] >= day_start + timedelta(days=1):
+            break
+        wakeups += 1
+        for when, target in queue.pop_due(head[0]):
+            queue.push(target, when + timedelta(days=1))
+    dispatch = time.perf_counter() - started
+    return register, reschedule, dispatch, wakeups
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10000, 100000]
+    day_start = datetime(2026, 1, 1)
+    random.seed(42)
+    for size in sizes:
+        # 发送时间集中在工作时间段，贴近实际分布
+        targets = [(f"group_{i}", random.randint(8 * 60, 18 * 60)) for i in range(size)]
+        print(f"\n目标数量: {size}")
+        print(f"{'引擎':<8}{'注册(秒)':>12}{'重新调度(微秒)':>16}{'整天调度(秒)':>14}{'唤醒次数':>10}")
+        for name, queue_cls in (("heap", IndexedTaskQueue), ("wheel", MinuteBucketQueue)):
+            register, reschedule, dispatch, wakeups = bench(queue_cls, targets, day_start)
+            print(
+                f"{name:<8}{register:>12.3f}{reschedule * 1e6:>16.2f}"
+                f"{dispatch:>14.3f}{wakeups:>10}"
+            )
+
+
+if __name__ == "__main__":
+    main()
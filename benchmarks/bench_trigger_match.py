@@ -0,0 +1,106 @@
+"""触发词匹配基准测试：测量 CommandHelper.handle_message 每秒可处理的消息数
+
+需要在安装了 AstrBot 的环境中运行：
+python benchmarks/bench_trigger_match.py [消息数量]
+"""
+
+import asyncio
+import importlib
+import os
+import random
+import sys
+import time
+
+PLUGIN_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.dirname(PLUGIN_DIR))
+plugin = os.path.basename(PLUGIN_DIR)
+CommandHelper = importlib.import_module(f"{plugin}.command_handler").CommandHelper
+TriggerMatcher = importlib.import_module(f"{plugin}.trigger_matcher").TriggerMatcher
+
+
+class _Message:
+    __slots__ = ("message_str",)
+
+    def __init__(self, text):
+        self.message_str = text
+
+
+class _Event:
+    """只包含 handle_message 用到的字段"""
+
+    __slots__ = ("message_obj", "unified_msg_origin")
+
+    def __init__(self, session, text):
+        self.message_obj = _Message(text)
+        self.unified_msg_origin = session
+
+    def get_sender_id(self):
+        return "10000"
+
+
+class _ConfigManager:
+    def __init__(self, group_settings):
+        self.group_settings = group_settings
+
+
+class _ImageManager:
+    """命中触发词后立即返回，只测量匹配路径"""
+
+    async def get_moyu_image(self):
+        return None
+
+
+WORDS = ["今天", "开会", "吃饭", "周报", "需求", "上线", "下班", "喝水", "review", "bug"]
+
+
+def make_messages(count, sessions, hit_rate):
+    messages = []
+    for _ in range(count):
+        text = "".join(random.choices(WORDS, k=random.randint(3, 12)))
+        if random.random() < hit_rate:
+            text += "摸鱼"
+        messages.append(_Event(random.choice(sessions), text))
+    return messages
+
+
+async def run(helper, messages):
+    started = time.perf_counter()
+    for event in messages:
+        await helper.handle_message(event)
+    return len(messages) / (time.perf_counter() - started)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    random.seed(42)
+    sessions = [f"aiocqhttp:GroupMessage:{i}" for i in range(1000)]
+    messages = make_messages(count, sessions, hit_rate=0.01)
+
+    cases = [
+        ("单个触发词 contains", "摸鱼", "contains"),
+        ("多个触发词 contains", "摸鱼|划水|下班啦|带薪拉屎", "contains"),
+        ("多个触发词 word", "摸鱼|划水|下班啦|带薪拉屎", "word"),
+        ("多个触发词 prefix", "摸鱼|划水|下班啦|带薪拉屎", "prefix"),
+        ("正则 regex", r"摸+鱼|划水", "regex"),
+    ]
+    # 关闭触发词限流，命中的消息都走完整的匹配与发送路径
+    config = {
+        "trigger_session_cooldown": 0,
+        "trigger_user_rate_per_minute": 0,
+        "trigger_global_rate_per_second": 0,
+    }
+    print(f"消息数量: {count}，会话数量: {len(sessions)}")
+    for name, trigger, mode in cases:
+        settings = {
+            session: {"trigger_word": trigger, "trigger_mode": mode}
+            for session in sessions
+        }
+        helper = CommandHelper(
+            _ConfigManager(settings), _ImageManager(), None, config=config
+        )
+        rate = asyncio.run(run(helper, messages))
+        print(f"{name:<20}{rate:>14,.0f} 条/秒")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,17 @@
 from astrbot.api.event import AstrMessageEvent, MessageEventResult, MessageChain
 from astrbot.api import logger
-from datetime import datetime, timedelta
+from datetime import datetime
 import re
 import traceback
 from functools import wraps
-from typing import AsyncGenerator
+from typing import Any, AsyncGenerator, Callable, Dict, Optional
+
+from .delivery import DeliveryPipeline
+from . import metrics
+from .rate_limiter import TriggerRateLimiter
+from .schedule_rules import ScheduleRule
+from .timezones import get_zone, to_local, utc_now
+from .trigger_matcher import TriggerMatcher
 
 
 def command_error_handler(func):
@@ -32,11 +39,35 @@ def command_error_handler(func):
 
 
 class CommandHelper:
-    def __init__(self, config_manager, image_manager, context, scheduler=None):
+    def __init__(
+        self,
+        config_manager,
+        image_manager,
+        context,
+        scheduler=None,
+        config=None,
+        delivery=None,
+    ):
         self.config_manager = config_manager
         self.image_manager = image_manager
         self.context = context
         self.scheduler = scheduler  # 添加调度器引用
+        # 统一的发送流程，默认与调度器共用
+        if delivery is None:
+            delivery = (
+                scheduler.delivery
+                if scheduler is not None
+                else DeliveryPipeline(image_manager, context, config)
+            )
+        self.delivery = delivery
+        # 触发词响应的会话、用户和全局限流
+        self.trigger_limiter = TriggerRateLimiter(config or {})
+        # 各会话预编译的触发词匹配器，触发词或匹配模式变化时失效重建
+        self._matchers: Dict[str, TriggerMatcher] = {}
+        # 消息预筛选：查找任意会话触发词首字符的函数，None表示存在正则触发词
+        # 无法预筛选；触发词或会话变化时置为过期，下次收到消息时重建
+        self._trigger_probe: Optional[Callable[[str], Any]] = None
+        self._prefilter_stale = True
 
     def parse_time_format(self, time_str: str) -> tuple[int, int]:
         """解析时间格式，支持HH:MM和HHMM格式"""
@@ -80,46 +111,41 @@ class CommandHelper:
     ) -> AsyncGenerator[MessageEventResult, None]:
         """处理设置时间命令"""
         try:
-            # 格式化时间字符串
-            if len(time_str) == 4:  # HHMM格式
-                time_str = f"{time_str[:2]}:{time_str[2:]}"
-            elif len(time_str) != 5:  # 不是HH:MM格式
-                yield event.make_result().message("时间格式错误，请使用HH:MM或HHMM格式")
-                return
-
-            # 验证时间格式
+            # 支持用逗号分隔的多个时间，每个时间为HH:MM或HHMM格式
             try:
-                hour, minute = map(int, time_str.split(":"))
-                if not (0 <= hour < 24 and 0 <= minute < 60):
-                    yield event.make_result().message(
-                        "时间格式错误，小时必须在0-23之间，分钟必须在0-59之间"
-                    )
-                    return
-            except ValueError:
+                times = sorted(
+                    {
+                        self.parse_time_format(part)
+                        for part in re.split(r"[,，]", time_str)
+                        if part.strip()
+                    }
+                )
+            except ValueError as e:
+                yield event.make_result().message(f"时间格式错误：{str(e)}")
+                return
+            if not times:
                 yield event.make_result().message("时间格式错误，请使用HH:MM或HHMM格式")
                 return
+            time_str = ScheduleRule.format_times(times)
 
             # 获取标准化的群组ID
             target = self.normalize_session_id(event)
 
-            # 更新配置
-            if target not in self.config_manager.group_settings:
-                self.config_manager.group_settings[target] = {}
-            self.config_manager.group_settings[target]["custom_time"] = time_str
-
-            # 保存配置
-            self.config_manager.save_config()
-
-            # 计算等待时间
-            now = datetime.now()
-            target_time = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+            # 更新并保存配置
+            self.config_manager.update_settings(target, custom_time=time_str)
+            self._prefilter_stale = True
 
-            # 如果目标时间已经过去，则设置为明天的这个时间
-            if target_time <= now:
-                target_time += timedelta(days=1)
+            # 增量调度该群并唤醒调度器，下一次发送时间按会话所在时区计算
+            target_time = None
+            if hasattr(self, "scheduler") and self.scheduler:
+                target_time = self.scheduler.schedule_target(target)
+                self.scheduler.wakeup_event.set()
+            if target_time is None:
+                yield event.make_result().message(f"✅ 定时发送已设置\n时间：{time_str}")
+                return
 
             # 计算等待的秒数
-            wait_seconds = int((target_time - now).total_seconds())
+            wait_seconds = int((target_time - utc_now()).total_seconds())
             hours = wait_seconds // 3600
             minutes = (wait_seconds % 3600) // 60
             seconds = wait_seconds % 60
@@ -133,11 +159,6 @@ class CommandHelper:
             if seconds > 0 or not wait_time_str:
                 wait_time_str += f"{seconds}秒"
 
-            # 唤醒调度器并更新任务队列
-            if hasattr(self, "scheduler") and self.scheduler:
-                self.scheduler.update_task_queue()
-                self.scheduler.wakeup_event.set()
-
             # 使用 make_result() 构建消息
             result = event.make_result()
             result.message(
@@ -174,21 +195,16 @@ class CommandHelper:
         )
 
         # 重置时间设置
-        if "custom_time" in self.config_manager.group_settings[target]:
-            del self.config_manager.group_settings[target]["custom_time"]
+        self.config_manager.unset_settings(target, "custom_time")
 
         # 如果没有其他设置，则保持触发词
         if len(self.config_manager.group_settings[target]) == 0:
-            self.config_manager.group_settings[target] = {"trigger_word": trigger_word}
-
-        self.config_manager.save_config()
+            self.config_manager.update_settings(target, trigger_word=trigger_word)
 
         # 更新调度器
         if hasattr(self, "scheduler") and self.scheduler:
             # 从任务队列中删除对应任务
             self.scheduler.remove_task(target)
-            # 更新任务队列
-            self.scheduler.update_task_queue()
             # 唤醒调度器
             self.scheduler.wakeup_event.set()
 
@@ -208,11 +224,74 @@ class CommandHelper:
 
         settings = self.config_manager.group_settings[target]
         trigger_word = settings.get("trigger_word", "摸鱼")
+        trigger_mode = settings.get("trigger_mode", TriggerMatcher.DEFAULT_MODE)
         time_setting = settings.get("custom_time", "未设置")
+        timezone_setting = settings.get("timezone", "默认")
+        weekdays_setting = settings.get("weekdays", ScheduleRule.DAILY)
         yield event.make_result().message(
-            f"当前群聊设置:\n发送时间: {time_setting}\n触发词: {trigger_word}"
+            f"当前群聊设置:\n发送时间: {time_setting}\n发送日期: {weekdays_setting}\n"
+            f"时区: {timezone_setting}\n触发词: {trigger_word}\n匹配模式: {trigger_mode}"
         )
 
+    @command_error_handler
+    async def handle_set_weekdays(
+        self, event: AstrMessageEvent, weekdays: str
+    ) -> AsyncGenerator[MessageEventResult, None]:
+        """设置发送日期：daily、workday，或 1-5、1,3,5 形式的星期列表"""
+        weekdays = (weekdays or "").strip().lower()
+        target = self.normalize_session_id(event)
+
+        # 先解析一次，提前发现无效的设置
+        ScheduleRule.parse_weekdays(weekdays)
+        if weekdays in ("", ScheduleRule.DAILY):
+            self.config_manager.unset_settings(target, "weekdays")
+            message = "✅ 已设置为每天发送"
+        else:
+            self.config_manager.update_settings(target, weekdays=weekdays)
+            self._prefilter_stale = True
+            message = f"✅ 已设置发送日期为: {weekdays}"
+
+        yield event.make_result().message(message + self._reschedule(target))
+
+    def _local_now(self, target: str) -> Optional[datetime]:
+        """会话所在时区的当前时间，用于渲染消息；没有调度器时返回None使用本机时间"""
+        if not self.scheduler:
+            return None
+        settings = self.config_manager.group_settings.get(target, {})
+        return to_local(utc_now(), self.scheduler.zone_of(settings))
+
+    def _reschedule(self, target: str) -> str:
+        """重新调度会话并唤醒调度器，返回显示下一次发送时间的提示"""
+        if not self.scheduler:
+            return ""
+        next_time = self.scheduler.schedule_target(target)
+        self.scheduler.wakeup_event.set()
+        if next_time is None:
+            return ""
+        settings = self.config_manager.group_settings.get(target, {})
+        local_next = to_local(next_time, self.scheduler.zone_of(settings))
+        return f"\n下一次发送时间: {local_next:%Y-%m-%d %H:%M %Z}"
+
+    @command_error_handler
+    async def handle_set_timezone(
+        self, event: AstrMessageEvent, zone_name: str
+    ) -> AsyncGenerator[MessageEventResult, None]:
+        """设置当前会话的时区，default 表示恢复为默认时区"""
+        zone_name = (zone_name or "").strip()
+        target = self.normalize_session_id(event)
+
+        if zone_name.lower() in ("", "default", "reset"):
+            self.config_manager.unset_settings(target, "timezone")
+            message = "✅ 已恢复为默认时区"
+        else:
+            # 先解析一次，提前发现无效的时区名称
+            get_zone(zone_name)
+            self.config_manager.update_settings(target, timezone=zone_name)
+            self._prefilter_stale = True
+            message = f"✅ 已设置时区为: {zone_name}"
+
+        yield event.make_result().message(message + self._reschedule(target))
+
     @command_error_handler
     async def handle_set_trigger(
         self, event: AstrMessageEvent, trigger: str
@@ -224,50 +303,126 @@ class CommandHelper:
         target = self.normalize_session_id(event)
         trigger = trigger.strip()
 
-        if target not in self.config_manager.group_settings:
-            self.config_manager.group_settings[target] = {"trigger_word": trigger}
-        else:
-            self.config_manager.group_settings[target]["trigger_word"] = trigger
+        # 先按当前匹配模式构建一次，提前发现无效的触发词
+        settings = self.config_manager.group_settings.get(target, {})
+        matcher = TriggerMatcher(
+            trigger, settings.get("trigger_mode", TriggerMatcher.DEFAULT_MODE)
+        )
 
-        self.config_manager.save_config()
+        self.config_manager.update_settings(target, trigger_word=trigger)
+        self._matchers[target] = matcher
+        self._prefilter_stale = True
         yield event.make_result().message(f"✅ 已设置触发词为: {trigger}")
 
     @command_error_handler
-    async def handle_execute_now(
-        self, event: AstrMessageEvent
+    async def handle_set_trigger_mode(
+        self, event: AstrMessageEvent, mode: str
     ) -> AsyncGenerator[MessageEventResult, None]:
-        """立即发送摸鱼人日历"""
-        try:
-            image_path = await self.image_manager.get_moyu_image()
-            if not image_path:
-                yield event.make_result().message("获取摸鱼图片失败，请稍后再试")
-                return
-
-            current_time = datetime.now().strftime("%Y-%m-%d %H:%M")
+        """设置触发词匹配模式"""
+        mode = (mode or "").strip().lower()
+        target = self.normalize_session_id(event)
+        settings = self.config_manager.group_settings.get(target, {})
 
-            # 获取消息内容
-            template = self.image_manager._get_next_template()
+        matcher = TriggerMatcher(settings.get("trigger_word", "摸鱼"), mode)
 
-            # 确保模板是字典类型并包含必要的键
-            if not isinstance(template, dict) or "format" not in template:
-                logger.error(f"模板格式不正确")
-                template = self.image_manager.default_template
+        self.config_manager.update_settings(target, trigger_mode=mode)
+        self._matchers[target] = matcher
+        self._prefilter_stale = True
+        yield event.make_result().message(f"✅ 已设置匹配模式为: {mode}")
 
+    def _get_matcher(self, target: str, settings: Dict) -> TriggerMatcher:
+        """获取会话的触发词匹配器，不存在时按当前设置构建"""
+        matcher = self._matchers.get(target)
+        if matcher is None:
+            trigger = settings.get("trigger_word", "摸鱼")
+            mode = settings.get("trigger_mode", TriggerMatcher.DEFAULT_MODE)
             try:
-                text = template["format"].format(time=current_time)
-                logger.info(f"使用模板: {template.get('name', '未命名模板')}")
-            except Exception as e:
-                logger.error(f"格式化模板时出错: {str(e)}")
-                # 使用一个简单的格式作为后备
-                text = f"摸鱼人日历\n当前时间：{current_time}"
+                matcher = TriggerMatcher(trigger, mode)
+            except ValueError as e:
+                logger.error(f"会话 {target} 的触发词设置无效，使用默认触发词: {str(e)}")
+                matcher = TriggerMatcher("摸鱼")
+            self._matchers[target] = matcher
+        return matcher
+
+    def _rebuild_prefilter(self) -> None:
+        """把所有会话触发词的首字符编译为一个字符类正则"""
+        chars = set()
+        for target, settings in self.config_manager.group_settings.items():
+            first_chars = self._get_matcher(target, settings).first_chars()
+            if first_chars is None:
+                chars = None
+                break
+            chars |= first_chars
+        if chars is None:
+            self._trigger_probe = None
+        elif chars:
+            pattern = "[" + "".join(re.escape(c) for c in sorted(chars)) + "]"
+            self._trigger_probe = re.compile(pattern).search
+        else:
+            self._trigger_probe = lambda text: None
+        self._prefilter_stale = False
+
+    def may_trigger(self, event: AstrMessageEvent) -> bool:
+        """快速预筛选：会话未配置或消息不含任何触发词首字符时返回False
+
+        绝大多数消息在这里即被排除，无需创建协程进入 handle_message。
+        """
+        if event.unified_msg_origin not in self.config_manager.group_settings:
+            metrics.TRIGGER_FILTERED.inc()
+            return False
+        if self._prefilter_stale:
+            self._rebuild_prefilter()
+        text = event.message_str
+        probe = self._trigger_probe
+        if not text or text[0] == "/" or (probe is not None and probe(text) is None):
+            metrics.TRIGGER_FILTERED.inc()
+            return False
+        return True
 
-            # 创建简单的消息段列表传递给chain_result
-            from astrbot.api.message_components import Plain, Image
+    @command_error_handler
+    async def handle_api_status(
+        self, event: AstrMessageEvent
+    ) -> AsyncGenerator[MessageEventResult, None]:
+        """查看API端点的熔断状态与健康评分"""
+        yield event.make_result().message(self.image_manager.get_endpoint_status())
 
-            message_segments = [Plain(text), Image(file=image_path)]
+    @command_error_handler
+    async def handle_moyu_stats(
+        self, event: AstrMessageEvent
+    ) -> AsyncGenerator[MessageEventResult, None]:
+        """查看插件运行指标"""
+        lines = [metrics.format_summary()]
 
-            # 使用消息段列表
-            yield event.chain_result(message_segments)
+        limiter = self.trigger_limiter.stats()
+        lines.append(
+            f"触发限流: 合并{limiter['coalesced']}次，会话冷却{limiter['dropped_session']}次，"
+            f"用户限流{limiter['dropped_user']}次，全局限流{limiter['dropped_global']}次"
+        )
+
+        batch = self.scheduler.last_batch_stats if self.scheduler else None
+        if batch:
+            lines.append(
+                f"最近一次定时发送: {batch['scheduled_time'].astimezone():%Y-%m-%d %H:%M}，"
+                f"成功{batch['sent']}/{batch['targets']}，耗时跨度{batch['skew_seconds']}秒，"
+                f"最大延迟{batch['max_lateness_seconds']}秒"
+            )
+        yield event.make_result().message("\n".join(lines))
+
+    @command_error_handler
+    async def handle_execute_now(
+        self, event: AstrMessageEvent
+    ) -> AsyncGenerator[MessageEventResult, None]:
+        """立即发送摸鱼人日历"""
+        try:
+            message = await self.delivery.prepare(
+                self._local_now(self.normalize_session_id(event))
+            )
+            if message is None:
+                yield event.make_result().message("获取摸鱼图片失败，请稍后再试")
+                return
+
+            # 结果装饰阶段会向消息链插入引用、@等组件，不能修改缓存的组件列表
+            yield event.chain_result(list(message.segments))
 
         except Exception as e:
             logger.error(f"执行立即发送命令时出错: {str(e)}")
@@ -283,53 +438,27 @@ class CommandHelper:
         target = self.normalize_session_id(event)
 
         # 如果是命令消息或群未配置，则跳过处理
-        if (
-            message_text.startswith("/")
-            or target not in self.config_manager.group_settings
-        ):
+        settings = self.config_manager.group_settings.get(target)
+        if settings is None or message_text.startswith("/"):
+            metrics.TRIGGER_FILTERED.inc()
             return
 
-        # 获取触发词并检查
-        trigger_word = self.config_manager.group_settings[target].get(
-            "trigger_word", "摸鱼"
-        )
-        if trigger_word not in message_text:
+        # 使用预编译的匹配器检查触发词
+        if not self._get_matcher(target, settings).match(message_text):
+            metrics.TRIGGER_UNMATCHED.inc()
+            return
+
+        # 限流：冷却中、超出配额或该会话已有响应正在发送时跳过
+        if not self.trigger_limiter.allow(target, event.get_sender_id()):
+            metrics.TRIGGER_LIMITED.inc()
             return
+        metrics.TRIGGER_MATCHED.inc()
 
         # 获取并发送摸鱼图片
         try:
-            image_path = await self.image_manager.get_moyu_image()
-            if not image_path:
-                return
-
-            current_time = datetime.now().strftime("%Y-%m-%d %H:%M")
-
-            # 获取消息内容
-            template = self.image_manager._get_next_template()
-
-            # 确保模板是字典类型并包含必要的键
-            if not isinstance(template, dict) or "format" not in template:
-                logger.error(f"触发词响应 - 模板格式不正确")
-                template = self.image_manager.default_template
-
-            try:
-                text = template["format"].format(time=current_time)
-                logger.info(f"触发词响应使用模板: {template.get('name', '未命名模板')}")
-            except Exception as e:
-                logger.error(f"触发词响应 - 格式化模板时出错: {str(e)}")
-                # 使用一个简单的格式作为后备
-                text = f"摸鱼人日历\n当前时间：{current_time}"
-
-            # 创建消息段列表
-            from astrbot.api.message_components import Plain, Image
-
-            message_segments = [Plain(text), Image(file=image_path)]
-
-            # 使用send_message直接发送消息段列表
-            from astrbot.api.event import MessageChain
-
-            message_chain = MessageChain(message_segments)
-            await self.context.send_message(target, message_chain)
+            await self.delivery.deliver(target, self._local_now(target))
         except Exception as e:
             logger.error(f"发送摸鱼人日历失败: {str(e)}")
             logger.error(traceback.format_exc())
+        finally:
+            self.trigger_limiter.release(target)
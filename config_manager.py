@@ -1,9 +1,12 @@
+import asyncio
 import json
 import os
 from astrbot.api import logger
 import traceback
 from functools import wraps
-from typing import Dict, Any, Optional, Callable
+from typing import Dict, Any, Optional, Callable, List, Tuple
+
+from .config_storage import JsonStorage, SqliteStorage
 
 
 def config_operation_handler(func: Callable):
@@ -30,62 +33,201 @@ def config_operation_handler(func: Callable):
 
 
 class ConfigManager:
-    def __init__(self, config_file: str):
+    # 存储模式：json 每次写入完整快照；journal 追加修改日志，定期压缩为快照；
+    # sqlite 每个会话一行，按行写入
+    STORAGE_JSON = "json"
+    STORAGE_JOURNAL = "journal"
+    STORAGE_SQLITE = "sqlite"
+
+    def __init__(self, config_file: str, config: Optional[Dict] = None):
+        """初始化配置管理器
+
+        Args:
+            config_file: 群组设置文件路径
+            config: 从_conf_schema.json加载的插件配置
+        """
         self.config_file = config_file
         self.group_settings: Dict[str, Dict[str, Any]] = {}
 
+        config = config or {}
+        self.storage_mode = config.get("config_storage_mode", self.STORAGE_JSON)
+        self.storage = self._create_storage()
+        # 日志记录数达到该值时压缩为完整快照
+        self.compact_threshold = config.get("journal_compact_threshold", 1000)
+        self._journal_size = 0
+        self._pending_records: List[Dict[str, Any]] = []
+        self._need_snapshot = False
+
+        # 延迟写入：防抖窗口内的多次修改合并为一次写入，0表示立即写入
+        self.save_debounce = config.get("config_save_debounce", 1.0)
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._flush_lock = asyncio.Lock()
+
+    def _create_storage(self):
+        """根据存储模式创建存储后端"""
+        if self.storage_mode == self.STORAGE_SQLITE:
+            return SqliteStorage(self._sqlite_file())
+        if self.storage_mode not in (self.STORAGE_JSON, self.STORAGE_JOURNAL):
+            logger.warning(f"未知的存储模式 {self.storage_mode}，使用json模式")
+            self.storage_mode = self.STORAGE_JSON
+        return JsonStorage(
+            self.config_file, journal=self.storage_mode == self.STORAGE_JOURNAL
+        )
+
+    def _sqlite_file(self) -> str:
+        """SQLite存储的数据库文件路径"""
+        return f"{os.path.splitext(self.config_file)[0]}.db"
+
     @config_operation_handler
     def load_config(self) -> Optional[bool]:
-        """加载配置文件
+        """加载配置，并重放快照之后的修改日志
 
         Returns:
             bool: 加载是否成功
         """
         self.group_settings = {}  # 确保初始化为空字典
 
-        if not os.path.exists(self.config_file):
+        storage = self.storage
+        if isinstance(storage, SqliteStorage) and storage.is_empty():
+            # 首次使用SQLite时从JSON配置迁移
+            storage = JsonStorage(self.config_file)
+        elif (
+            isinstance(storage, JsonStorage)
+            and not os.path.exists(storage.config_file)
+            and not os.path.exists(storage.journal_file)
+            and os.path.exists(self._sqlite_file())
+        ):
+            # 从SQLite切换回JSON时，从数据库迁移
+            storage = SqliteStorage(self._sqlite_file())
+
+        snapshot, records, torn = storage.load()
+        if snapshot is None:
             logger.info("配置文件不存在，将创建新的配置文件")
+            self._need_snapshot = True
+        else:
+            self._load_snapshot(snapshot)
+
+        for record in records:
+            self._apply_record(record)
+        if records:
+            logger.info(f"已重放摸鱼人配置日志: {len(records)}条修改")
+        self._journal_size = len(records)
+
+        # 日志末尾损坏、非日志模式下残留日志或日志过长时，立即压缩为快照，
+        # 避免后续记录追加在损坏的行后面
+        if torn or (
+            records
+            and (
+                self.storage_mode != self.STORAGE_JOURNAL
+                or len(records) >= self.compact_threshold
+            )
+        ):
+            self._need_snapshot = True
+
+        if isinstance(storage, SqliteStorage) and storage is not self.storage:
+            self._migrate_from_sqlite(storage)
+        elif storage is not self.storage:
+            self._migrate_to_sqlite()
+        elif self._need_snapshot:
             return self.save_config()
 
-        with open(self.config_file, "r", encoding="utf-8") as f:
-            loaded_data = f.read().strip()
-            if not loaded_data:  # 处理空文件的情况
-                logger.warning("配置文件为空，使用默认空字典")
-                return True
-
-            loaded_settings = json.loads(loaded_data)
-            if not isinstance(loaded_settings, dict):
-                raise ValueError(
-                    f"配置文件格式错误：期望字典类型，实际为 {type(loaded_settings)}"
-                )
-
-            # 验证加载的配置并迁移旧配置
-            for target, settings in loaded_settings.items():
-                if not isinstance(settings, dict):
-                    logger.warning(f"跳过无效的群设置 {target}: {settings}")
-                    continue
-
-                # 初始化群设置
-                self.group_settings[target] = {}
-
-                # 兼容旧版本配置，保留custom_time
-                if "custom_time" in settings:
-                    self.group_settings[target]["custom_time"] = settings["custom_time"]
-
-                # 加载触发词设置，如果不存在则使用默认值"摸鱼"
-                self.group_settings[target]["trigger_word"] = settings.get(
-                    "trigger_word", "摸鱼"
-                )
-
-            logger.info(f"已加载摸鱼人配置: {len(self.group_settings)}个群聊的设置")
-            return True
+        logger.info(f"已加载摸鱼人配置: {len(self.group_settings)}个群聊的设置")
+        return True
+
+    def _migrate_to_sqlite(self) -> None:
+        """将JSON配置写入SQLite，并把原文件重命名保留"""
+        self.storage.write(self._snapshot(), [], {})
+        self._need_snapshot = False
+        json_storage = JsonStorage(self.config_file)
+        for path in (json_storage.config_file, json_storage.journal_file):
+            if os.path.exists(path):
+                os.replace(path, f"{path}.migrated")
+        logger.info(f"已将 {len(self.group_settings)} 个群聊的设置迁移到SQLite")
+
+    def _migrate_from_sqlite(self, sqlite_storage: SqliteStorage) -> None:
+        """将SQLite中的设置写入JSON配置，并把数据库文件重命名保留"""
+        self.storage.write(self._snapshot(), [], {})
+        self._need_snapshot = False
+        sqlite_storage.close()
+        db_file = sqlite_storage.db_file
+        # 连接正常关闭后WAL文件已合并，残留的文件随数据库一起保留
+        for path in (db_file, f"{db_file}-wal", f"{db_file}-shm"):
+            if os.path.exists(path):
+                os.replace(path, f"{path}.migrated")
+        logger.info(f"已将 {len(self.group_settings)} 个群聊的设置从SQLite迁移到JSON")
+
+    def _load_snapshot(self, loaded_settings: Any) -> None:
+        """加载配置快照，验证格式并迁移旧配置"""
+        if not isinstance(loaded_settings, dict):
+            raise ValueError(
+                f"配置文件格式错误：期望字典类型，实际为 {type(loaded_settings)}"
+            )
+
+        # 验证加载的配置并迁移旧配置
+        for target, settings in loaded_settings.items():
+            if not isinstance(settings, dict):
+                logger.warning(f"跳过无效的群设置 {target}: {settings}")
+                continue
+
+            # 初始化群设置，兼容旧版本配置，保留custom_time等已有设置
+            self.group_settings[target] = dict(settings)
+
+            # 加载触发词设置，如果不存在则使用默认值"摸鱼"
+            self.group_settings[target]["trigger_word"] = settings.get(
+                "trigger_word", "摸鱼"
+            )
+
+    def _apply_record(self, record: Dict[str, Any]) -> None:
+        """应用一条修改记录"""
+        target = record.get("target")
+        if not isinstance(target, str):
+            return
+        if record.get("op") == "set":
+            self.group_settings.setdefault(target, {}).update(record.get("fields", {}))
+        elif record.get("op") == "unset" and target in self.group_settings:
+            for key in record.get("keys", []):
+                self.group_settings[target].pop(key, None)
+
+    def update_settings(self, target: str, **fields: Any) -> Dict[str, Any]:
+        """修改群组设置并保存
+
+        Args:
+            target: 会话ID
+            fields: 要设置的字段
+
+        Returns:
+            Dict[str, Any]: 修改后的群组设置
+        """
+        record = {"op": "set", "target": target, "fields": fields}
+        self._apply_record(record)
+        self._persist_record(record)
+        return self.group_settings[target]
+
+    def unset_settings(self, target: str, *keys: str) -> None:
+        """删除群组设置中的字段并保存"""
+        if target not in self.group_settings:
+            return
+        record = {"op": "unset", "target": target, "keys": list(keys)}
+        self._apply_record(record)
+        self._persist_record(record)
+
+    def _persist_record(self, record: Dict[str, Any]) -> None:
+        """保存一条修改：支持按条保存的存储只写入该修改，否则写入完整快照"""
+        if not self.storage.per_record:
+            self.save_config()
+            return
+        self._pending_records.append(record)
+        self._schedule_flush()
 
     @config_operation_handler
     def save_config(self) -> Optional[bool]:
-        """保存配置到文件
+        """保存完整配置
+
+        事件循环运行时只加入写入计划，在防抖窗口结束后于线程池中序列化并
+        原子写入；没有运行中的事件循环或关闭防抖时立即写入。
 
         Returns:
-            bool: 保存是否成功
+            bool: 保存是否成功（延迟写入时表示已加入写入计划）
         """
         # 确保group_settings是字典类型
         if not isinstance(self.group_settings, dict):
@@ -93,7 +235,94 @@ class ConfigManager:
                 f"保存配置失败：group_settings类型错误 ({type(self.group_settings)})"
             )
 
-        with open(self.config_file, "w", encoding="utf-8") as f:
-            json.dump(self.group_settings, f, ensure_ascii=False, indent=2)
-        logger.info("摸鱼人配置已保存")
+        self._need_snapshot = True
+        return self._schedule_flush()
+
+    def _schedule_flush(self) -> bool:
+        """安排一次延迟写入，无法延迟时立即写入"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+
+        if loop is None or self.save_debounce <= 0:
+            snapshot, records, rows = self._take_pending()
+            self.storage.write(snapshot, records, rows)
+            self._after_write(snapshot, records)
+            return True
+
+        if self._flush_handle is None:
+            self._flush_handle = loop.call_later(
+                self.save_debounce, lambda: asyncio.ensure_future(self.flush())
+            )
         return True
+
+    def _take_pending(self) -> Tuple[
+        Optional[Dict[str, Dict[str, Any]]],
+        List[Dict[str, Any]],
+        Dict[str, Optional[Dict[str, Any]]],
+    ]:
+        """取出待写入的内容
+
+        Returns:
+            Tuple: (需要完整写入时的快照；待追加的日志记录；修改过的会话及其当前设置)
+        """
+        records, self._pending_records = self._pending_records, []
+        if self._need_snapshot or (
+            self.storage_mode == self.STORAGE_JOURNAL
+            and self._journal_size + len(records) >= self.compact_threshold
+        ):
+            self._need_snapshot = False
+            # 快照已包含这些记录的修改，无需再追加
+            return self._snapshot(), [], {}
+
+        rows = {}
+        for record in records:
+            settings = self.group_settings.get(record["target"])
+            rows[record["target"]] = dict(settings) if settings is not None else None
+        return None, records, rows
+
+    def _snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """复制当前群组设置，供线程池中序列化使用"""
+        return {target: dict(settings) for target, settings in self.group_settings.items()}
+
+    def _after_write(
+        self,
+        snapshot: Optional[Dict[str, Dict[str, Any]]],
+        records: List[Dict[str, Any]],
+    ) -> None:
+        """写入成功后更新日志计数"""
+        if snapshot is not None:
+            self._journal_size = 0
+            logger.info("摸鱼人配置已保存")
+        else:
+            self._journal_size += len(records)
+
+    async def flush(self) -> None:
+        """立即写入待保存的配置"""
+        self._flush_handle = None
+        async with self._flush_lock:
+            if not self._need_snapshot and not self._pending_records:
+                return
+            snapshot, records, rows = self._take_pending()
+            try:
+                await asyncio.to_thread(self.storage.write, snapshot, records, rows)
+                self._after_write(snapshot, records)
+            except Exception as e:
+                # 写入失败时恢复待写入状态，下次保存时重试
+                if snapshot is not None:
+                    self._need_snapshot = True
+                self._pending_records = records + self._pending_records
+                if isinstance(e, (IOError, OSError)):
+                    logger.error(f"文件操作错误: {str(e)}")
+                else:
+                    logger.error(f"flush 执行出错: {str(e)}")
+                    logger.error(traceback.format_exc())
+
+    async def close(self) -> None:
+        """取消延迟写入计划，写入所有未保存的修改并关闭存储"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        await self.flush()
+        self.storage.close()
@@ -0,0 +1,162 @@
+import json
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+from astrbot.api import logger
+
+
+class JsonStorage:
+    """JSON文件存储：完整快照写入config.json，可选追加修改日志
+
+    journal为False时每次保存写入完整快照；为True时每条修改追加到
+    config.json.journal，由ConfigManager按阈值压缩为快照。
+    """
+
+    def __init__(self, config_file: str, journal: bool = False):
+        self.config_file = config_file
+        self.journal_file = f"{config_file}.journal"
+        self.journal = journal
+        # 是否按条保存修改，而不是每次写入完整快照
+        self.per_record = journal
+
+    def load(self) -> Tuple[Optional[Dict[str, Any]], List[Dict[str, Any]], bool]:
+        """读取快照和修改日志
+
+        Returns:
+            Tuple: (快照内容，文件不存在时为None；日志记录；日志末尾是否损坏)
+        """
+        snapshot = None
+        if os.path.exists(self.config_file):
+            with open(self.config_file, "r", encoding="utf-8") as f:
+                loaded_data = f.read().strip()
+            if not loaded_data:  # 处理空文件的情况
+                logger.warning("配置文件为空，使用默认空字典")
+                snapshot = {}
+            else:
+                snapshot = json.loads(loaded_data)
+
+        records, torn = self._read_journal()
+        return snapshot, records, torn
+
+    def _read_journal(self) -> Tuple[List[Dict[str, Any]], bool]:
+        """读取修改日志，写入中途崩溃只会损坏最后一条记录，忽略其后的内容"""
+        records = []
+        if not os.path.exists(self.journal_file):
+            return records, False
+
+        with open(self.journal_file, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    logger.warning("配置日志末尾记录不完整，已忽略")
+                    return records, True
+        return records, False
+
+    def write(
+        self,
+        snapshot: Optional[Dict[str, Dict[str, Any]]],
+        records: List[Dict[str, Any]],
+        rows: Dict[str, Optional[Dict[str, Any]]],
+    ) -> None:
+        """写入快照或追加日志记录，可在线程池中执行"""
+        if snapshot is not None:
+            self._write_atomic(snapshot)
+            # 快照已包含日志中的全部修改
+            if os.path.exists(self.journal_file):
+                os.remove(self.journal_file)
+        elif records:
+            self._append_journal(records)
+
+    def _append_journal(self, records: List[Dict[str, Any]]) -> None:
+        """追加修改记录到日志并落盘"""
+        with open(self.journal_file, "a", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _write_atomic(self, data: Dict[str, Dict[str, Any]]) -> None:
+        """先写入临时文件并落盘，再原子替换配置文件，避免写入中途崩溃损坏配置"""
+        temp_file = f"{self.config_file}.tmp"
+        with open(temp_file, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_file, self.config_file)
+
+    def close(self) -> None:
+        pass
+
+
+class SqliteStorage:
+    """SQLite存储：每个会话一行，以会话ID为主键
+
+    使用WAL模式，每次修改只写入对应会话的一行。连接在线程池和事件循环
+    线程之间共享，由内部锁保证同一时间只有一个操作。
+    """
+
+    per_record = True
+
+    def __init__(self, db_file: str):
+        self.db_file = db_file
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_file, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS group_settings (
+                session TEXT PRIMARY KEY,
+                settings TEXT NOT NULL
+            )"""
+        )
+        self._conn.commit()
+
+    def is_empty(self) -> bool:
+        """数据库中是否还没有任何会话"""
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM group_settings LIMIT 1").fetchone()
+        return row is None
+
+    def load(self) -> Tuple[Optional[Dict[str, Any]], List[Dict[str, Any]], bool]:
+        """读取全部会话设置，返回格式与JsonStorage.load一致"""
+        settings = {}
+        with self._lock:
+            rows = self._conn.execute("SELECT session, settings FROM group_settings")
+            for session, data in rows:
+                try:
+                    settings[session] = json.loads(data)
+                except json.JSONDecodeError:
+                    logger.warning(f"跳过无效的群设置 {session}: {data}")
+        return settings, [], False
+
+    def write(
+        self,
+        snapshot: Optional[Dict[str, Dict[str, Any]]],
+        records: List[Dict[str, Any]],
+        rows: Dict[str, Optional[Dict[str, Any]]],
+    ) -> None:
+        """写入完整快照或逐行写入修改过的会话，可在线程池中执行"""
+        with self._lock, self._conn:
+            if snapshot is not None:
+                self._conn.execute("DELETE FROM group_settings")
+                rows = snapshot
+            for session, settings in rows.items():
+                if settings is None:
+                    self._conn.execute(
+                        "DELETE FROM group_settings WHERE session = ?", (session,)
+                    )
+                    continue
+                self._conn.execute(
+                    "INSERT INTO group_settings (session, settings) VALUES (?, ?) "
+                    "ON CONFLICT(session) DO UPDATE SET settings = excluded.settings",
+                    (session, json.dumps(settings, ensure_ascii=False)),
+                )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
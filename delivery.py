@@ -0,0 +1,235 @@
+import asyncio
+import base64
+import time
+import traceback
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from astrbot.api import logger
+from astrbot.api.event import MessageChain
+from astrbot.api.message_components import Plain, Image
+
+from .rate_limiter import PlatformRateLimiter
+
+# 阶段钩子：hook(阶段名, 耗时秒数, 是否成功, 发送目标)，发送目标只在发送阶段提供
+DeliveryHook = Callable[[str, float, bool, Optional[str]], None]
+
+
+class PreparedMessage:
+    """准备好的摸鱼人日历消息，可以发送给多个会话
+
+    消息会被缓存复用，segments 只能读取；交给会插入组件的调用方（如
+    event.chain_result）时需要先复制列表。
+    """
+
+    __slots__ = ("image_path", "text", "segments", "chain")
+
+    def __init__(self, image_path: str, text: str, segments: List, chain: MessageChain):
+        self.image_path = image_path
+        self.text = text
+        self.segments = segments
+        self.chain = chain
+
+
+class DeliveryPipeline:
+    """统一的发送流程：获取图片 → 渲染文本 → 构建消息链 → 发送
+
+    定时发送、立即发送和触发词响应都经过这里，共享图片缓存、平台限速、
+    失败重试和阶段耗时钩子。
+    """
+
+    STAGE_RESOLVE = "resolve"
+    STAGE_RENDER = "render"
+    STAGE_BUILD = "build"
+    STAGE_SEND = "send"
+
+    MODE_FILE = "file"
+    MODE_BASE64 = "base64"
+    MODE_URL = "url"
+    IMAGE_SEND_MODES = (MODE_FILE, MODE_BASE64, MODE_URL)
+
+    def __init__(self, image_manager, context, config: Optional[Dict] = None):
+        """初始化发送流程
+
+        Args:
+            image_manager: 图片管理器
+            context: AstrBot上下文，用于发送消息
+            config: 从_conf_schema.json加载的配置
+        """
+        self.image_manager = image_manager
+        self.context = context
+        config = config or {}
+
+        # 批量发送：并发数与各平台的限速（条/秒）
+        self.send_concurrency = config.get("send_concurrency", 10)
+        self.rate_limiter = PlatformRateLimiter(
+            config.get("send_rate_per_platform", 0),
+            self._parse_platform_rates(config.get("platform_rate_limits", [])),
+        )
+        # 发送失败后的重试次数与退避基数（秒）
+        self.max_retries = config.get("send_max_retries", 0)
+        self.retry_backoff = config.get("send_retry_backoff", 2)
+        self._hooks: List[DeliveryHook] = []
+
+        # 图片发送方式：file 由适配器读取本地文件；base64 只读取一次文件，
+        # 之后直接复用编码后的数据；url 让平台从图片来源地址拉取，无需上传
+        self.image_send_mode = config.get("image_send_mode", self.MODE_FILE)
+        if self.image_send_mode not in self.IMAGE_SEND_MODES:
+            logger.warning(f"未知的图片发送方式 {self.image_send_mode}，使用file")
+            self.image_send_mode = self.MODE_FILE
+        # 按图片版本复用的图片组件和最近一次构建的消息
+        self._image_component: Optional[Tuple[str, Any]] = None
+        self._prepared: Optional[PreparedMessage] = None
+
+    @staticmethod
+    def _parse_platform_rates(items: List[str]) -> Dict[str, float]:
+        """解析 平台名=速率 格式的平台限速配置"""
+        rates = {}
+        for item in items:
+            try:
+                platform, rate = item.split("=", 1)
+                rates[platform.strip()] = float(rate)
+            except ValueError:
+                logger.error(f"无效的平台限速配置: {item}")
+        return rates
+
+    def add_hook(self, hook: DeliveryHook) -> None:
+        """注册阶段钩子，每个阶段结束后调用"""
+        self._hooks.append(hook)
+
+    def _emit(
+        self, stage: str, started: float, ok: bool, target: Optional[str] = None
+    ) -> None:
+        elapsed = time.monotonic() - started
+        for hook in self._hooks:
+            try:
+                hook(stage, elapsed, ok, target)
+            except Exception as e:
+                logger.error(f"发送钩子执行出错: {str(e)}")
+
+    async def prepare(self, now: Optional[datetime] = None) -> Optional[PreparedMessage]:
+        """获取图片、渲染文本并构建消息链
+
+        Returns:
+            Optional[PreparedMessage]: 获取图片失败时返回None
+        """
+        started = time.monotonic()
+        image_path = await self.image_manager.get_moyu_image()
+        self._emit(self.STAGE_RESOLVE, started, bool(image_path))
+        if not image_path:
+            return None
+
+        started = time.monotonic()
+        text = self.image_manager.render_message(now)
+        self._emit(self.STAGE_RENDER, started, True)
+
+        started = time.monotonic()
+        message = self._prepared
+        # 图片和文本都没有变化时直接复用上一次构建的消息
+        if message is None or message.image_path != image_path or message.text != text:
+            image = await self._image_for(image_path)
+            segments = [Plain(text), image]
+            message = PreparedMessage(
+                image_path, text, segments, MessageChain(list(segments))
+            )
+            self._prepared = message
+        self._emit(self.STAGE_BUILD, started, True)
+        return message
+
+    async def _image_for(self, image_path: str) -> Any:
+        """获取图片组件，同一张图片只构建一次
+
+        图片存储按内容哈希命名文件，因此路径相同即为同一版本的图片。
+        """
+        cached = self._image_component
+        if cached is not None and cached[0] == image_path:
+            return cached[1]
+
+        image = None
+        if self.image_send_mode == self.MODE_URL:
+            source_url = self.image_manager.get_source_url(image_path)
+            if source_url:
+                image = Image.fromURL(source_url)
+        elif self.image_send_mode == self.MODE_BASE64:
+            try:
+                data = await asyncio.to_thread(self._read_file, image_path)
+                image = Image.fromBase64(base64.b64encode(data).decode())
+            except OSError as e:
+                logger.error(f"读取图片失败，改为按文件发送: {str(e)}")
+        if image is None:
+            image = Image(file=image_path)
+
+        self._image_component = (image_path, image)
+        return image
+
+    @staticmethod
+    def _read_file(path: str) -> bytes:
+        with open(path, "rb") as f:
+            return f.read()
+
+    async def send(self, target: str, message: PreparedMessage) -> bool:
+        """按平台限速发送消息，失败时按配置退避重试
+
+        Returns:
+            bool: 是否发送成功
+        """
+        for attempt in range(self.max_retries + 1):
+            await self.rate_limiter.acquire(target)
+            started = time.monotonic()
+            try:
+                await self.context.send_message(target, message.chain)
+                self._emit(self.STAGE_SEND, started, True, target)
+                logger.info(f"已向 {target} 发送摸鱼人日历")
+                return True
+            except Exception as e:
+                self._emit(self.STAGE_SEND, started, False, target)
+                logger.error(
+                    f"向 {target} 发送消息失败（第{attempt + 1}次）：{str(e)}"
+                )
+                if attempt >= self.max_retries:
+                    logger.error(traceback.format_exc())
+                    return False
+                await asyncio.sleep(self.retry_backoff * (2**attempt))
+        return False
+
+    async def deliver(self, target: str, now: Optional[datetime] = None) -> bool:
+        """向单个会话发送摸鱼人日历，获取图片失败时返回False"""
+        message = await self.prepare(now)
+        if message is None:
+            return False
+        return await self.send(target, message)
+
+    async def deliver_many(
+        self, targets: List[str], now: Optional[datetime] = None
+    ) -> Optional[Dict]:
+        """向多个会话发送同一条消息
+
+        消息只准备一次，然后通过并发受限的工作池发送给所有目标。
+
+        Returns:
+            Optional[Dict]: 发送统计，delivered 为发送成功的会话；获取图片失败时返回None
+        """
+        message = await self.prepare(now)
+        if message is None:
+            return None
+
+        semaphore = asyncio.Semaphore(max(self.send_concurrency, 1))
+        send_times: List[float] = []
+        delivered: List[str] = []
+
+        async def send_one(target: str) -> None:
+            async with semaphore:
+                if await self.send(target, message):
+                    send_times.append(time.monotonic())
+                    delivered.append(target)
+
+        await asyncio.gather(*(send_one(target) for target in targets))
+
+        # 批量发送的时间跨度：从第一条发送成功到最后一条发送成功
+        skew = (max(send_times) - min(send_times)) if send_times else 0.0
+        return {
+            "targets": len(targets),
+            "sent": len(send_times),
+            "failed": len(targets) - len(send_times),
+            "skew_seconds": round(skew, 3),
+            "delivered": delivered,
+        }
@@ -0,0 +1,153 @@
+import asyncio
+import json
+import os
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+from astrbot.api import logger
+
+# 一次定时发送的标识：(会话ID, 当地日期 YYYY-MM-DD, 当地时刻 HH:MM)
+DeliveryKey = Tuple[str, str, str]
+
+
+class DeliveryLedger:
+    """定时发送记录，用于重启后补发停机期间错过的发送并避免重复发送
+
+    每个会话只保留最近一次定时发送的状态：发送前记为 sending，发送完成后
+    记为 done 或 failed。另外记录检查点：早于检查点的定时发送都已处理。
+    重启时只补发检查点之后（含）错过的发送；仍为 sending 的发送可能已经
+    送达，不会重发。
+
+    修改追加写入日志文件，记录数超过阈值时压缩为快照。
+    """
+
+    SENDING = "sending"
+    DONE = "done"
+    FAILED = "failed"
+
+    def __init__(self, ledger_file: str, compact_threshold: int = 10000):
+        self.ledger_file = ledger_file
+        self.journal_file = f"{ledger_file}.journal"
+        self.compact_threshold = compact_threshold
+        self._records: Dict[str, Tuple[str, str, str]] = {}
+        self._checkpoint: Optional[float] = None
+        self._journal_size = 0
+        self._need_snapshot = False
+        self._lock = asyncio.Lock()
+
+    @property
+    def checkpoint(self) -> Optional[datetime]:
+        """检查点（UTC），早于它的定时发送都已处理，没有记录时为None"""
+        if self._checkpoint is None:
+            return None
+        return datetime.fromtimestamp(self._checkpoint, timezone.utc)
+
+    def load(self) -> None:
+        """加载快照并重放日志"""
+        try:
+            if os.path.exists(self.ledger_file):
+                with open(self.ledger_file, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                self._checkpoint = data.get("checkpoint")
+                for target, record in data.get("records", {}).items():
+                    self._records[target] = tuple(record)
+        except (OSError, ValueError) as e:
+            logger.error(f"读取定时发送记录失败，将重新记录: {str(e)}")
+            self._records = {}
+            self._checkpoint = None
+            self._need_snapshot = True
+
+        if not os.path.exists(self.journal_file):
+            return
+        try:
+            with open(self.journal_file, "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        self._apply(json.loads(line))
+                    except ValueError:
+                        # 写入中途崩溃只会损坏最后一条记录
+                        logger.warning("定时发送记录末尾不完整，已忽略")
+                        self._need_snapshot = True
+                        break
+                    self._journal_size += 1
+        except OSError as e:
+            logger.error(f"读取定时发送记录日志失败: {str(e)}")
+            self._need_snapshot = True
+        if self._journal_size >= self.compact_threshold:
+            self._need_snapshot = True
+
+    def _apply(self, entry: Dict) -> None:
+        if "checkpoint" in entry:
+            self._checkpoint = entry["checkpoint"]
+        else:
+            self._records[entry["t"]] = (entry["d"], entry["s"], entry["st"])
+
+    def state_of(self, key: DeliveryKey) -> Optional[str]:
+        """获取一次定时发送的状态，没有记录时返回None"""
+        target, day, slot = key
+        record = self._records.get(target)
+        if record is None or record[0] != day or record[1] != slot:
+            return None
+        return record[2]
+
+    async def mark(
+        self, keys: List[DeliveryKey], state: str, checkpoint: Optional[datetime] = None
+    ) -> None:
+        """记录一批定时发送的状态，写入落盘后返回"""
+        entries = [{"t": target, "d": day, "s": slot, "st": state} for target, day, slot in keys]
+        if checkpoint is not None:
+            entries.append({"checkpoint": checkpoint.timestamp()})
+        if entries:
+            await self._write(entries)
+
+    async def update_checkpoint(self, checkpoint: datetime) -> None:
+        """记录检查点，早于它的定时发送都已处理"""
+        await self._write([{"checkpoint": checkpoint.timestamp()}])
+
+    async def _write(self, entries: List[Dict]) -> None:
+        async with self._lock:
+            for entry in entries:
+                self._apply(entry)
+            try:
+                if self._need_snapshot or self._journal_size + len(entries) >= self.compact_threshold:
+                    await asyncio.to_thread(self._write_snapshot, self._snapshot())
+                    self._journal_size = 0
+                    self._need_snapshot = False
+                else:
+                    await asyncio.to_thread(self._append_journal, entries)
+                    self._journal_size += len(entries)
+            except OSError as e:
+                # 记录写入失败不影响发送，下次写入时改为完整快照
+                self._need_snapshot = True
+                logger.error(f"写入定时发送记录失败: {str(e)}")
+
+    def _snapshot(self) -> Dict:
+        return {
+            "checkpoint": self._checkpoint,
+            "records": {target: list(record) for target, record in self._records.items()},
+        }
+
+    def _append_journal(self, entries: List[Dict]) -> None:
+        with open(self.journal_file, "a", encoding="utf-8") as f:
+            for entry in entries:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _write_snapshot(self, data: Dict) -> None:
+        """原子写入快照并删除已合并的日志"""
+        temp_file = f"{self.ledger_file}.tmp"
+        with open(temp_file, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_file, self.ledger_file)
+        if os.path.exists(self.journal_file):
+            os.remove(self.journal_file)
+
+    async def close(self, checkpoint: datetime) -> None:
+        """记录最后的检查点并压缩为快照"""
+        self._need_snapshot = True
+        await self.update_checkpoint(checkpoint)
@@ -0,0 +1,221 @@
+import time
+from collections import deque
+from typing import Deque, Dict, List, Tuple
+from astrbot.api import logger
+
+
+class CircuitState:
+    """熔断器状态"""
+
+    CLOSED = "closed"  # 正常放行
+    OPEN = "open"  # 熔断中，直接跳过
+    HALF_OPEN = "half_open"  # 试探恢复，只放行少量请求
+
+
+class EndpointHealth:
+    """单个API端点的熔断器与健康评分"""
+
+    # 请求结果类型
+    OK = "ok"
+    ERROR = "error"
+    TIMEOUT = "timeout"
+    INVALID = "invalid"
+
+    def __init__(
+        self,
+        url: str,
+        failure_threshold: int,
+        recovery_timeout: float,
+        window_size: int,
+        request_timeout: float,
+    ):
+        """初始化端点健康状态
+
+        Args:
+            url: API端点地址
+            failure_threshold: 连续失败多少次后熔断
+            recovery_timeout: 熔断后多少秒进入半开状态
+            window_size: 健康评分的滑动窗口大小
+            request_timeout: 请求超时时间，用于延迟评分和半开试探间隔
+        """
+        self.url = url
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.request_timeout = request_timeout
+        self.state = CircuitState.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.last_probe_at = 0.0
+        self.last_sample_at = 0.0
+        # 滑动窗口，元素为 (结果类型, 耗时秒数)
+        self.samples: Deque[Tuple[str, float]] = deque(maxlen=window_size)
+
+    def allow_request(self) -> bool:
+        """判断当前是否允许请求该端点"""
+        now = time.monotonic()
+        if self.state == CircuitState.OPEN:
+            if now - self.opened_at < self.recovery_timeout:
+                return False
+            self.state = CircuitState.HALF_OPEN
+            logger.info(f"API {self.url} 熔断恢复期已过，进入半开状态")
+
+        if self.state == CircuitState.HALF_OPEN:
+            # 半开状态下每个超时周期只放行一次试探请求
+            if now - self.last_probe_at < self.request_timeout:
+                return False
+            self.last_probe_at = now
+        return True
+
+    def record(self, outcome: str, latency: float) -> None:
+        """记录一次请求结果"""
+        self.samples.append((outcome, latency))
+        self.last_sample_at = time.monotonic()
+
+        if outcome == self.OK:
+            if self.state != CircuitState.CLOSED:
+                logger.info(f"API {self.url} 已恢复，关闭熔断器")
+            self.state = CircuitState.CLOSED
+            self.consecutive_failures = 0
+            return
+
+        self.consecutive_failures += 1
+        if self.state == CircuitState.HALF_OPEN or (
+            self.state == CircuitState.CLOSED
+            and self.consecutive_failures >= self.failure_threshold
+        ):
+            self.state = CircuitState.OPEN
+            self.opened_at = time.monotonic()
+            logger.warning(
+                f"API {self.url} 连续失败 {self.consecutive_failures} 次，"
+                f"熔断 {self.recovery_timeout} 秒"
+            )
+
+    def _rate(self, *outcomes: str) -> float:
+        if not self.samples:
+            return 0.0
+        return sum(1 for o, _ in self.samples if o in outcomes) / len(self.samples)
+
+    @property
+    def error_rate(self) -> float:
+        """错误率（含超时）"""
+        return self._rate(self.ERROR, self.TIMEOUT)
+
+    @property
+    def invalid_rate(self) -> float:
+        """无效图片率"""
+        return self._rate(self.INVALID)
+
+    @property
+    def avg_latency(self) -> float:
+        """成功请求的平均耗时"""
+        latencies = [lat for o, lat in self.samples if o == self.OK]
+        return sum(latencies) / len(latencies) if latencies else 0.0
+
+    @property
+    def score(self) -> float:
+        """健康评分，范围0-100，综合错误率、无效图片率和延迟"""
+        if not self.samples:
+            return 100.0
+        latency_ratio = min(self.avg_latency / max(self.request_timeout, 0.001), 1.0)
+        score = (
+            100.0
+            - 50.0 * self.error_rate
+            - 30.0 * self.invalid_rate
+            - 20.0 * latency_ratio
+        )
+        return max(score, 0.0)
+
+    def snapshot(self) -> Dict:
+        """导出当前状态"""
+        return {
+            "url": self.url,
+            "state": self.state,
+            "score": round(self.score, 1),
+            "error_rate": round(self.error_rate, 3),
+            "invalid_rate": round(self.invalid_rate, 3),
+            "avg_latency": round(self.avg_latency, 3),
+            "consecutive_failures": self.consecutive_failures,
+            "samples": len(self.samples),
+        }
+
+
+class EndpointHealthTracker:
+    """管理所有API端点的健康状态，并据此调整请求顺序"""
+
+    def __init__(self, config: Dict, request_timeout: float):
+        """初始化健康状态管理器
+
+        Args:
+            config: 从_conf_schema.json加载的配置
+            request_timeout: API请求超时时间
+        """
+        self.failure_threshold = config.get("circuit_failure_threshold", 3)
+        self.recovery_timeout = config.get("circuit_recovery_timeout", 60)
+        self.window_size = config.get("health_window_size", 20)
+        self.degraded_score = config.get("health_degraded_score", 60)
+        self.request_timeout = request_timeout
+        self.endpoints: Dict[str, EndpointHealth] = {}
+
+    def get(self, url: str) -> EndpointHealth:
+        """获取端点的健康状态，不存在时创建"""
+        health = self.endpoints.get(url)
+        if health is None:
+            health = EndpointHealth(
+                url,
+                self.failure_threshold,
+                self.recovery_timeout,
+                self.window_size,
+                self.request_timeout,
+            )
+            self.endpoints[url] = health
+        return health
+
+    def record(self, url: str, outcome: str, latency: float) -> None:
+        """记录端点的一次请求结果"""
+        self.get(url).record(outcome, latency)
+
+    def order_endpoints(self, api_endpoints: List[str]) -> List[str]:
+        """按健康状态排列端点
+
+        熔断中的端点被跳过；健康端点保持配置顺序在前，评分低于阈值的
+        端点和半开试探中的端点排在后面。降级端点在恢复时间内没有新的
+        请求记录时恢复原有顺序，避免因一直排在后面而无法恢复评分。
+        """
+        now = time.monotonic()
+        ordered = []
+        for idx, url in enumerate(api_endpoints):
+            health = self.get(url)
+            if not health.allow_request():
+                logger.info(f"API {url} 处于熔断状态，跳过")
+                continue
+            rank = 0
+            if health.state == CircuitState.HALF_OPEN:
+                rank = 2
+            elif (
+                health.score < self.degraded_score
+                and now - health.last_sample_at < self.recovery_timeout
+            ):
+                rank = 1
+            ordered.append((rank, idx, url))
+        ordered.sort()
+        return [url for _, _, url in ordered]
+
+    def format_status(self, api_endpoints: List[str]) -> str:
+        """生成端点状态的文本描述"""
+        state_names = {
+            CircuitState.CLOSED: "正常",
+            CircuitState.OPEN: "熔断",
+            CircuitState.HALF_OPEN: "半开",
+        }
+        lines = ["API端点状态:"]
+        for idx, url in enumerate(api_endpoints):
+            info = self.get(url).snapshot()
+            lines.append(
+                f"{idx+1}. {url}\n"
+                f"   状态: {state_names.get(info['state'], info['state'])} "
+                f"评分: {info['score']}\n"
+                f"   错误率: {info['error_rate']:.1%} "
+                f"无效率: {info['invalid_rate']:.1%} "
+                f"平均耗时: {info['avg_latency']:.2f}秒"
+            )
+        return "\n".join(lines)
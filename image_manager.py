@@ -1,15 +1,20 @@
 import aiohttp
-import random
+import hashlib
 from datetime import datetime
 from astrbot.api import logger
 from astrbot.api.message_components import Plain, Image
 import traceback
 import os
 import asyncio
-from typing import List, Optional, Union, Dict
+from typing import List, Optional, Union, Dict, Tuple, Any
 from functools import wraps
 from astrbot.api.event import MessageChain
-import json
+import time
+
+from .endpoint_health import EndpointHealth, EndpointHealthTracker
+from .image_store import ImageStore
+from .message_template import compile_templates
+from .metrics import CACHE_HIT, CACHE_MISS, FETCH_SECONDS
 
 
 def image_operation_handler(func):
@@ -32,15 +37,21 @@ def image_operation_handler(func):
 
 
 class ImageManager:
-    def __init__(self, temp_dir: str, config: Dict):
+    def __init__(self, image_dir: str, config: Dict):
         """初始化图片管理器
 
         Args:
-            temp_dir: 临时目录路径
+            image_dir: 图片存储目录路径
             config: 从_conf_schema.json加载的配置
         """
-        self.temp_dir = temp_dir
+        self.image_dir = image_dir
         self.config = config
+        # 按内容哈希命名的图片存储，重启后保留，超出上限时按LRU淘汰
+        self.image_store = ImageStore(
+            image_dir,
+            int(config.get("image_store_max_mb", 50) * 1024 * 1024),
+            config.get("image_store_max_files", 60),
+        )
         self.templates = config.get("templates", [])
         self.default_template = config.get(
             "default_template",
@@ -54,101 +65,278 @@ class ImageManager:
             ],
         )
         self.request_timeout = config.get("request_timeout", 5)
+        # 对冲请求延迟（秒），0表示关闭，按顺序故障转移
+        self.hedge_delay = config.get("hedge_delay", 0)
+        # 下载大小上限与分块大小
+        self.max_image_size = int(config.get("max_image_size_mb", 10) * 1024 * 1024)
+        self.download_chunk_size = 64 * 1024
+        # 各端点的熔断器与健康评分
+        self.endpoint_health = EndpointHealthTracker(config, self.request_timeout)
         self.current_template_index = 0  # 添加模板索引计数器
 
-        # 确保模板列表不为空
-        if not self.templates:
-            self.templates = [self.default_template]
+        # 按日期缓存图片，键为 (日期, API端点)，同一天内的请求直接复用
+        self.cache_enabled = config.get("image_cache_enabled", True)
+        self._daily_cache: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._cache_date: Optional[str] = None
+
+        # 正在进行的下载任务，相同键的并发请求共享同一个任务
+        self._inflight: Dict[Tuple[str, Tuple[str, ...]], asyncio.Task] = {}
+
+        # 图片的来源地址（跟随重定向后的最终URL），键为图片路径，供按URL发送使用
+        self._source_urls: Dict[str, str] = {}
+
+        # 共享的HTTP会话与连接池配置，会话在首次请求时创建
+        self.connection_limit = config.get("connection_limit", 100)
+        self.connection_limit_per_host = config.get("connection_limit_per_host", 10)
+        self.keepalive_timeout = config.get("keepalive_timeout", 30)
+        self.dns_cache_ttl = config.get("dns_cache_ttl", 300)
+        self._session: Optional[aiohttp.ClientSession] = None
+
+        # 模板在加载时编译，无效模板此时即报告并忽略
+        self.compiled_templates = compile_templates(
+            self.templates, self.default_template
+        )
 
         logger.info(f"已加载API端点: {len(self.api_endpoints)}个")
-        logger.info(f"已加载消息模板: {len(self.templates)}个")
-
-    def _get_next_template(self) -> Dict:
-        """按顺序获取下一个消息模板"""
-        if not self.templates:
-            logger.warning("模板列表为空，使用默认模板")
-            return self.default_template
-
-        # 确保模板列表是有效的
-        valid_templates = []
-        for tmpl in self.templates:
-            # 解析字符串模板
-            if isinstance(tmpl, str):
+        logger.info(f"已加载消息模板: {len(self.compiled_templates)}个")
+
+    def render_message(self, now: Optional[datetime] = None) -> str:
+        """按顺序选择下一个消息模板并渲染
+
+        Args:
+            now: 渲染使用的时间，默认为当前时间
+        """
+        template = self.compiled_templates[self.current_template_index]
+        # 更新索引，实现循环
+        self.current_template_index = (self.current_template_index + 1) % len(
+            self.compiled_templates
+        )
+        logger.info(f"使用模板: {template.name}")
+        return template.render(now or datetime.now())
+
+    def _remember_source_url(self, image_path: str, url: str) -> None:
+        """记录图片的来源地址，只保留最近的少量记录"""
+        if len(self._source_urls) >= 16:
+            self._source_urls.pop(next(iter(self._source_urls)))
+        self._source_urls[image_path] = url
+
+    def get_source_url(self, image_path: str) -> Optional[str]:
+        """获取图片的来源地址，本地备用图片等没有来源时返回None"""
+        return self._source_urls.get(image_path)
+
+    def get_endpoint_status(self) -> str:
+        """获取所有API端点的熔断状态与健康评分"""
+        return self.endpoint_health.format_status(list(self.api_endpoints))
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """获取共享的HTTP会话，不存在或已关闭时重新创建"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.connection_limit,
+                limit_per_host=self.connection_limit_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=self.dns_cache_ttl,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.request_timeout),
+            )
+            logger.info("已创建摸鱼人插件共享HTTP会话")
+        return self._session
+
+    async def close(self) -> None:
+        """关闭共享的HTTP会话"""
+        if self._session and not self._session.closed:
+            await self._session.close()
+            logger.info("已关闭摸鱼人插件共享HTTP会话")
+        self._session = None
+
+    def _refresh_cache_date(self) -> str:
+        """检查日期是否变化，跨过本地零点时清空缓存
+
+        Returns:
+            str: 当前日期字符串
+        """
+        today = datetime.now().strftime("%Y-%m-%d")
+        if self._cache_date != today:
+            if self._daily_cache:
+                logger.info(f"日期已变更为 {today}，清空摸鱼人日历图片缓存")
+            self.invalidate_cache()
+            self._cache_date = today
+        return today
+
+    def invalidate_cache(self) -> None:
+        """清空图片缓存，图片文件由图片存储按LRU淘汰"""
+        self._daily_cache.clear()
+
+    async def has_cached_image(self) -> bool:
+        """当天是否已有从API获取的缓存图片"""
+        return await self._get_cached_image(list(self.api_endpoints)) is not None
+
+    async def _get_cached_image(self, api_endpoints: List[str]) -> Optional[str]:
+        """按端点优先级查找当天的缓存图片"""
+        today = self._refresh_cache_date()
+        for api_url in api_endpoints:
+            entry = self._daily_cache.get((today, api_url))
+            if not entry:
+                continue
+            # 缓存文件被外部删除时，用内存中的数据通过图片存储恢复
+            if not os.path.exists(entry["path"]):
                 try:
-                    tmpl_dict = json.loads(tmpl)
-                    valid_templates.append(tmpl_dict)
-                except json.JSONDecodeError:
-                    logger.error(f"无法解析模板字符串: {tmpl}")
+                    await self.image_store.restore(entry["path"], entry["data"])
+                except OSError as e:
+                    logger.error(f"恢复缓存图片失败: {str(e)}")
+                    del self._daily_cache[(today, api_url)]
                     continue
-            # 验证字典模板
-            elif isinstance(tmpl, dict) and "format" in tmpl:
-                valid_templates.append(tmpl)
-            else:
-                logger.warning(f"无效的模板格式: {tmpl}")
-
-        if not valid_templates:
-            logger.warning("没有有效的模板，使用默认模板")
-            return self.default_template
-
-        # 按顺序获取模板
-        template = valid_templates[self.current_template_index]
-        # 更新索引，实现循环
-        self.current_template_index = (self.current_template_index + 1) % len(valid_templates)
+            self.image_store.touch(entry["path"])
+            return entry["path"]
+        return None
 
-        return template
+    def _put_cached_image(self, api_url: str, img_path: str, content: bytes) -> None:
+        """缓存当天从指定端点获取的图片"""
+        today = self._refresh_cache_date()
+        self._daily_cache[(today, api_url)] = {
+            "path": img_path,
+            "data": content,
+            "fetched_at": datetime.now(),
+        }
 
     @image_operation_handler
     async def get_moyu_image(self) -> Optional[str]:
-        """获取摸鱼人日历图片"""
+        """获取摸鱼人日历图片，同一天内优先返回缓存"""
         api_endpoints = list(self.api_endpoints)
 
-        # 所有API都直接返回图片，逐个尝试直到成功
-        for idx, api_url in enumerate(api_endpoints):
-            try:
-                # 设置配置中指定的超时时间
-                timeout = aiohttp.ClientTimeout(total=self.request_timeout)
-                async with aiohttp.ClientSession(timeout=timeout) as session:
-                    # 直接下载图片
-                    try:
-                        img_path = await self._download_image(session, api_url)
-                        if img_path:
-                            logger.info(f"成功获取图片，API索引: {idx+1}")
-                            return img_path
-                        else:
-                            logger.error(f"API {api_url} 无法获取有效图片")
-                    except Exception as e:
-                        logger.error(f"下载 {api_url} 失败: {str(e)}")
-
-            except asyncio.TimeoutError:
-                logger.error(f"API {api_url} 请求超时")
-                continue
-            except Exception as e:
-                logger.error(f"处理API {api_url} 时出错: {str(e)}")
-                continue
+        if self.cache_enabled:
+            cached_path = await self._get_cached_image(api_endpoints)
+            if cached_path:
+                CACHE_HIT.inc()
+                return cached_path
+            CACHE_MISS.inc()
+
+        # 合并并发请求：同一时刻只发起一次下载，其余调用者等待同一个结果
+        key = (datetime.now().strftime("%Y-%m-%d"), tuple(api_endpoints))
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch_moyu_image(api_endpoints))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # 使用shield，避免单个调用者被取消时连带取消共享的下载任务
+        return await asyncio.shield(task)
+
+    async def _fetch_moyu_image(self, api_endpoints: List[str]) -> Optional[str]:
+        """尝试各个API端点下载图片，全部失败时使用本地备用图片"""
+        # 根据健康状态跳过熔断中的端点并调整顺序
+        api_endpoints = self.endpoint_health.order_endpoints(api_endpoints)
+
+        if self.hedge_delay > 0 and len(api_endpoints) > 1:
+            result = await self._fetch_hedged(api_endpoints)
+        else:
+            result = await self._fetch_sequential(api_endpoints)
+
+        if result:
+            api_url, img_path, content = result
+            if self.cache_enabled:
+                self._put_cached_image(api_url, img_path, content)
+            return img_path
 
         # 所有API都失败了，尝试使用本地备用图片
         logger.error("所有API都失败了，尝试使用本地备用图片")
         local_backup = os.path.join(os.path.dirname(__file__), "backup_moyu.jpg")
         if os.path.exists(local_backup):
-            # 复制备用图片到临时目录
-            temp_path = os.path.join(
-                self.temp_dir, f"moyu_backup_{random.randint(1000, 9999)}.jpg"
-            )
-            try:
-                import shutil
+            # 备用图片只读不改，直接使用插件目录中的文件
+            logger.info(f"使用本地备用图片")
+            return local_backup
 
-                shutil.copy(local_backup, temp_path)
-                logger.info(f"使用本地备用图片")
-                return temp_path
-            except Exception as e:
-                logger.error(f"复制本地备用图片失败: {str(e)}")
+        return None
+
+    async def _try_endpoint(
+        self, idx: int, api_url: str
+    ) -> Optional[Tuple[str, str, bytes]]:
+        """从单个API端点下载图片
+
+        Returns:
+            Optional[Tuple[str, str, bytes]]: API端点、图片路径和图片内容
+        """
+        try:
+            # 复用共享会话，避免每次请求都重新建立连接
+            session = self._get_session()
+            result = await self._download_image(session, api_url)
+            if result:
+                img_path, content = result
+                logger.info(f"成功获取图片，API索引: {idx+1}")
+                return api_url, img_path, content
+            logger.error(f"API {api_url} 无法获取有效图片")
+        except asyncio.TimeoutError:
+            logger.error(f"API {api_url} 请求超时")
+        except Exception as e:
+            logger.error(f"处理API {api_url} 时出错: {str(e)}")
+        return None
+
+    async def _fetch_sequential(
+        self, api_endpoints: List[str]
+    ) -> Optional[Tuple[str, str, bytes]]:
+        """按顺序逐个尝试API端点，直到成功"""
+        for idx, api_url in enumerate(api_endpoints):
+            result = await self._try_endpoint(idx, api_url)
+            if result:
+                return result
+        return None
+
+    async def _fetch_hedged(
+        self, api_endpoints: List[str]
+    ) -> Optional[Tuple[str, str, bytes]]:
+        """对冲请求：当前端点超过hedge_delay仍未返回时并行请求下一个端点
+
+        取第一个成功返回的图片，并取消其余仍在进行的请求。某个端点失败时
+        立即启动下一个端点，不再等待对冲延迟。
+        """
+        remaining = list(enumerate(api_endpoints))
+        pending = set()
+        winner = None
+
+        try:
+            idx, api_url = remaining.pop(0)
+            pending.add(asyncio.ensure_future(self._try_endpoint(idx, api_url)))
+
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending,
+                    timeout=self.hedge_delay if remaining else None,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+
+                # 同时完成的多余结果不删除文件：相同图片与胜出结果共用同一个文件，
+                # 图片存储已按内容去重，其余文件由LRU淘汰
+                for task in done:
+                    result = task.result()
+                    if result and winner is None:
+                        winner = result
+                if winner:
+                    return winner
+
+                # 超过对冲延迟仍未返回或有端点失败，启动下一个端点
+                if remaining:
+                    idx, api_url = remaining.pop(0)
+                    if not done:
+                        logger.info(
+                            f"API响应超过 {self.hedge_delay} 秒，并行请求 {api_url}"
+                        )
+                    pending.add(asyncio.ensure_future(self._try_endpoint(idx, api_url)))
+        finally:
+            for task in pending:
+                task.cancel()
 
         return None
 
     async def _download_image(
         self, session: aiohttp.ClientSession, url: str
-    ) -> Optional[str]:
-        """下载图片并保存到临时文件"""
+    ) -> Optional[Tuple[str, bytes]]:
+        """下载图片并保存到临时文件
+
+        Returns:
+            Optional[Tuple[str, bytes]]: 图片路径和图片内容
+        """
+        started = time.monotonic()
         try:
             # 使用配置中指定的超时时间
             timeout = aiohttp.ClientTimeout(total=self.request_timeout)
@@ -162,19 +350,21 @@ class ImageManager:
                 # 检查状态码
                 if response.status != 200:
                     logger.error(f"下载图片失败，状态码: {response.status}")
+                    self._record_health(url, EndpointHealth.ERROR, started)
                     return None
 
                 # 检查内容类型
                 content_type = response.headers.get("content-type", "")
 
-                # 读取响应内容
-                content = await response.read()
-                content_size = len(content)
-
-                if not content or content_size < 1000:  # 图片通常大于1KB
+                # 声明的长度超过上限时直接放弃，不再读取响应体
+                if (
+                    response.content_length is not None
+                    and response.content_length > self.max_image_size
+                ):
                     logger.error(
-                        f"下载的内容太小，可能不是有效图片: {content_size} 字节"
+                        f"图片过大，已放弃下载: {response.content_length} 字节"
                     )
+                    self._record_health(url, EndpointHealth.INVALID, started)
                     return None
 
                 # 尝试检测图片格式
@@ -187,21 +377,70 @@ class ImageManager:
                     elif "gif" in content_type:
                         image_format = "gif"
 
-                # 生成临时文件路径
-                image_path = os.path.join(
-                    self.temp_dir, f"moyu_{random.randint(1000, 9999)}.{image_format}"
-                )
-
-                # 保存图片
-                with open(image_path, "wb") as f:
-                    f.write(content)
+                # 分块流式写入临时文件，完成后按内容哈希存入图片存储
+                result = await self._stream_to_file(response, image_format)
+                if result is None:
+                    self._record_health(url, EndpointHealth.INVALID, started)
+                    return None
+                image_path, content = result
+                self._remember_source_url(image_path, str(response.url))
 
-                return image_path
+                self._record_health(url, EndpointHealth.OK, started)
+                return image_path, content
 
         except asyncio.TimeoutError:
             logger.error(f"下载图片超时: {url}")
+            self._record_health(url, EndpointHealth.TIMEOUT, started)
             return None
         except Exception as e:
             logger.error(f"下载图片时出错: {str(e)}")
             logger.error(traceback.format_exc())
+            self._record_health(url, EndpointHealth.ERROR, started)
             return None
+
+    async def _stream_to_file(
+        self, response: aiohttp.ClientResponse, image_format: str
+    ) -> Optional[Tuple[str, bytes]]:
+        """将响应体分块写入临时文件，校验通过后原子重命名为以内容哈希命名的文件
+
+        文件操作放到线程池中执行，避免阻塞事件循环。超过大小上限或内容过小
+        时删除临时文件。
+
+        Returns:
+            Optional[Tuple[str, bytes]]: 图片路径和图片内容，无效时返回None
+        """
+        temp_path = self.image_store.new_temp_path()
+        digest = hashlib.sha256()
+        chunks: List[bytes] = []
+        total = 0
+        f = await asyncio.to_thread(open, temp_path, "wb")
+        try:
+            async for chunk in response.content.iter_chunked(self.download_chunk_size):
+                total += len(chunk)
+                if total > self.max_image_size:
+                    logger.error(f"图片超过大小上限 {self.max_image_size} 字节，已中止下载")
+                    return None
+                chunks.append(chunk)
+                digest.update(chunk)
+                await asyncio.to_thread(f.write, chunk)
+
+            if total < 1000:  # 图片通常大于1KB
+                logger.error(f"下载的内容太小，可能不是有效图片: {total} 字节")
+                return None
+
+            await asyncio.to_thread(f.close)
+            image_path = await self.image_store.commit(
+                temp_path, digest.hexdigest(), image_format
+            )
+            return image_path, b"".join(chunks)
+        finally:
+            if not f.closed:
+                await asyncio.to_thread(f.close)
+            if os.path.exists(temp_path):
+                await asyncio.to_thread(os.remove, temp_path)
+
+    def _record_health(self, url: str, outcome: str, started: float) -> None:
+        """记录端点请求结果，用于熔断与健康评分"""
+        elapsed = time.monotonic() - started
+        self.endpoint_health.record(url, outcome, elapsed)
+        FETCH_SECONDS.observe(elapsed, url, outcome)
@@ -0,0 +1,145 @@
+import asyncio
+import os
+import uuid
+from collections import OrderedDict
+from typing import Dict
+from astrbot.api import logger
+
+
+class ImageStore:
+    """按内容哈希命名的本地图片存储
+
+    相同内容的图片只保存一份，文件名为内容的SHA-256。存储目录在重启后
+    保留，启动时按文件修改时间重建LRU顺序，超出字节数或文件数上限时
+    淘汰最久未使用的图片。
+    """
+
+    TEMP_SUFFIX = ".part"
+
+    def __init__(self, store_dir: str, max_bytes: int, max_files: int):
+        """初始化图片存储
+
+        Args:
+            store_dir: 存储目录
+            max_bytes: 存储占用的字节数上限
+            max_files: 存储的文件数上限
+        """
+        self.store_dir = store_dir
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        # 文件名 -> 文件大小，按最近使用顺序排列，最久未使用的在前
+        self._index: "OrderedDict[str, int]" = OrderedDict()
+        self._total_bytes = 0
+
+        os.makedirs(self.store_dir, exist_ok=True)
+        self._load_index()
+
+    def _load_index(self) -> None:
+        """扫描存储目录，重建LRU索引并清理残留的临时文件"""
+        entries = []
+        for name in os.listdir(self.store_dir):
+            path = os.path.join(self.store_dir, name)
+            try:
+                if name.endswith(self.TEMP_SUFFIX):
+                    os.remove(path)
+                    continue
+                stat = os.stat(path)
+            except OSError as e:
+                logger.error(f"读取图片存储文件失败: {str(e)}")
+                continue
+            entries.append((stat.st_mtime, name, stat.st_size))
+
+        for _, name, size in sorted(entries):
+            self._index[name] = size
+            self._total_bytes += size
+        self._evict()
+        logger.info(
+            f"已加载图片存储: {len(self._index)}个文件，共 {self._total_bytes} 字节"
+        )
+
+    def new_temp_path(self) -> str:
+        """生成一个不会冲突的临时文件路径，用于下载过程中写入"""
+        return os.path.join(self.store_dir, f".{uuid.uuid4().hex}{self.TEMP_SUFFIX}")
+
+    def path_of(self, name: str) -> str:
+        """获取存储文件的完整路径"""
+        return os.path.join(self.store_dir, name)
+
+    async def commit(self, temp_path: str, digest: str, ext: str) -> str:
+        """将下载完成的临时文件按内容哈希存入存储
+
+        已存在相同内容的文件时删除临时文件，直接复用已有文件。
+
+        Args:
+            temp_path: 临时文件路径
+            digest: 文件内容的SHA-256十六进制摘要
+            ext: 文件扩展名
+
+        Returns:
+            str: 存储中的文件路径
+        """
+        name = f"{digest}.{ext}"
+        path = self.path_of(name)
+        if name in self._index and os.path.exists(path):
+            await asyncio.to_thread(os.remove, temp_path)
+            self.touch(path)
+            return path
+
+        await asyncio.to_thread(os.replace, temp_path, path)
+        self.register(path, os.path.getsize(path))
+        return path
+
+    async def restore(self, path: str, data: bytes) -> None:
+        """用内存中的图片内容重新写入被外部删除的存储文件
+
+        先写入临时文件再原子重命名，文件操作在线程池中执行。
+        """
+        temp_path = self.new_temp_path()
+        try:
+            await asyncio.to_thread(self._write_file, temp_path, data)
+            await asyncio.to_thread(os.replace, temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                await asyncio.to_thread(os.remove, temp_path)
+        self.register(path, len(data))
+
+    @staticmethod
+    def _write_file(path: str, data: bytes) -> None:
+        with open(path, "wb") as f:
+            f.write(data)
+
+    def register(self, path: str, size: int) -> None:
+        """登记存储目录中新写入的文件，并按需淘汰旧文件"""
+        name = os.path.basename(path)
+        self._total_bytes -= self._index.pop(name, 0)
+        self._index[name] = size
+        self._total_bytes += size
+        self._evict()
+
+    def touch(self, path: str) -> None:
+        """标记文件为最近使用，同时更新修改时间以便重启后恢复LRU顺序"""
+        name = os.path.basename(path)
+        if name not in self._index:
+            return
+        self._index.move_to_end(name)
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def _evict(self) -> None:
+        """淘汰最久未使用的文件，直到满足上限，最近使用的文件始终保留"""
+        while len(self._index) > 1 and (
+            self._total_bytes > self.max_bytes or len(self._index) > self.max_files
+        ):
+            name, size = self._index.popitem(last=False)
+            self._total_bytes -= size
+            try:
+                os.remove(self.path_of(name))
+                logger.info(f"已淘汰缓存图片: {name}")
+            except OSError as e:
+                logger.error(f"淘汰缓存图片失败: {str(e)}")
+
+    def stats(self) -> Dict[str, int]:
+        """获取存储占用情况"""
+        return {"files": len(self._index), "bytes": self._total_bytes}
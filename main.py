@@ -3,13 +3,14 @@ from astrbot.api.star import Context, Star, register
 from astrbot.api import logger
 from astrbot.api.event.filter import event_message_type, EventMessageType
 import os
-import tempfile
 import traceback
 
 from .config_manager import ConfigManager
 from .image_manager import ImageManager
 from .command_handler import CommandHelper
 from .scheduler import Scheduler
+from .delivery_ledger import DeliveryLedger
+from . import metrics
 
 
 @register(
@@ -31,43 +32,75 @@ class MoyuRenPlugin(Star):
     - 支持自定义API端点和消息模板
 
     命令：
-    - /set_time HH:MM - 设置发送时间，格式为24小时制
+    - /set_time HH:MM - 设置发送时间，格式为24小时制，多个时间用逗号分隔
+    - /set_weekdays 日期 - 设置发送日期：daily、workday，或 1-5、1,3,5 形式的星期
     - /reset_time - 重置当前群聊的时间设置
     - /list_time - 查看当前群聊的时间设置
+    - /set_timezone 时区 - 设置当前群聊的时区，如 Asia/Shanghai，default 恢复默认
     - /next_time - 查看下一次执行的时间
     - /execute_now - 立即发送摸鱼人日历
-    - /set_trigger 触发词 - 设置触发词，默认为"摸鱼"
+    - /set_trigger 触发词 - 设置触发词，默认为"摸鱼"，多个触发词用|分隔
+    - /set_trigger_mode 模式 - 设置触发词匹配模式：contains/word/prefix/regex
+    - /api_status - 查看API端点的熔断状态与健康评分
+    - /moyu_stats - 查看下载、缓存、渲染、发送与触发词等运行指标
     """
 
     def __init__(self, context: Context, config: dict = None):
         super().__init__(context)
-        self.temp_dir = tempfile.mkdtemp()
+        self.image_dir = os.path.join(os.path.dirname(__file__), "image_cache")
         self.config_file = os.path.join(os.path.dirname(__file__), "config.json")
+        self.ledger_file = os.path.join(os.path.dirname(__file__), "delivery_ledger.json")
 
         # 初始化各个管理器
         logger.info("开始初始化摸鱼人插件...")
-        self.config_manager = ConfigManager(self.config_file)
-
         # 使用从AstrBot获取的配置（通过_conf_schema.json）
         self.plugin_config = config or {}
         logger.info(f"加载插件配置: {self.plugin_config}")
 
-        self.image_manager = ImageManager(self.temp_dir, self.plugin_config)
-        self.scheduler = Scheduler(self.config_manager, self.image_manager, context)
+        self.config_manager = ConfigManager(self.config_file, self.plugin_config)
+
+        self.image_manager = ImageManager(self.image_dir, self.plugin_config)
+        self.delivery_ledger = DeliveryLedger(self.ledger_file)
+        self.scheduler = Scheduler(
+            self.config_manager,
+            self.image_manager,
+            context,
+            self.plugin_config,
+            ledger=self.delivery_ledger,
+        )
         self.command_helper = CommandHelper(
-            self.config_manager, self.image_manager, context, self.scheduler
+            self.config_manager,
+            self.image_manager,
+            context,
+            self.scheduler,
+            self.plugin_config,
         )
 
+        # 指标：记录发送流程各阶段耗时，按配置定期导出到文件
+        self.scheduler.delivery.add_hook(metrics.delivery_hook)
+        self.metrics_exporter = None
+        metrics_file = self.plugin_config.get("metrics_export_file", "")
+        if metrics_file:
+            self.metrics_exporter = metrics.PrometheusFileExporter(
+                metrics.REGISTRY,
+                metrics_file,
+                self.plugin_config.get("metrics_export_interval", 60),
+            )
+
         # 加载配置
         logger.info("加载摸鱼人插件配置...")
         self.config_manager.load_config()
         logger.info(f"当前配置: {self.config_manager.group_settings}")
+        # 加载定时发送记录，用于补发停机期间错过的发送
+        self.delivery_ledger.load()
 
         # 启动定时任务
         logger.info("启动摸鱼人插件定时任务...")
         self.scheduler.start()
         # 立即更新任务队列
         self.scheduler.update_task_queue()
+        if self.metrics_exporter:
+            self.metrics_exporter.start()
         logger.info("摸鱼人插件初始化完成")
 
         # 保存实例引用
@@ -91,21 +124,54 @@ class MoyuRenPlugin(Star):
         async for result in self.command_helper.handle_list_time(event):
             yield result
 
+    @filter.command("set_weekdays")
+    async def set_weekdays(self, event: AstrMessageEvent, weekdays: str):
+        """设置发送日期：daily、workday，或 1-5、1,3,5 形式的星期列表"""
+        async for result in self.command_helper.handle_set_weekdays(event, weekdays):
+            yield result
+
+    @filter.command("set_timezone")
+    async def set_timezone(self, event: AstrMessageEvent, zone: str):
+        """设置当前群聊的时区，如 Asia/Shanghai，default 恢复默认"""
+        async for result in self.command_helper.handle_set_timezone(event, zone):
+            yield result
+
     @filter.command("set_trigger")
     async def set_trigger(self, event: AstrMessageEvent, trigger: str):
         """设置触发词，默认为"摸鱼" """
         async for result in self.command_helper.handle_set_trigger(event, trigger):
             yield result
 
+    @filter.command("set_trigger_mode")
+    async def set_trigger_mode(self, event: AstrMessageEvent, mode: str):
+        """设置触发词匹配模式：contains/word/prefix/regex"""
+        async for result in self.command_helper.handle_set_trigger_mode(event, mode):
+            yield result
+
     @filter.command("execute_now")
     async def execute_now(self, event: AstrMessageEvent):
         """立即发送摸鱼人日历"""
         async for result in self.command_helper.handle_execute_now(event):
             yield result
 
+    @filter.command("api_status")
+    async def api_status(self, event: AstrMessageEvent):
+        """查看API端点的熔断状态与健康评分"""
+        async for result in self.command_helper.handle_api_status(event):
+            yield result
+
+    @filter.command("moyu_stats")
+    async def moyu_stats(self, event: AstrMessageEvent):
+        """查看插件运行指标"""
+        async for result in self.command_helper.handle_moyu_stats(event):
+            yield result
+
     @event_message_type(EventMessageType.ALL)
     async def on_all_message(self, event: AstrMessageEvent):
         """处理消息事件，检测触发词"""
+        # 未配置的会话和不可能命中触发词的消息在预筛选中直接返回
+        if not self.command_helper.may_trigger(event):
+            return
         await self.command_helper.handle_message(event)
 
     async def terminate(self):
@@ -117,22 +183,20 @@ class MoyuRenPlugin(Star):
                 logger.error("找不到摸鱼人插件实例，无法正常终止")
                 return
 
-            # 停止定时任务
+            # 停止定时任务，并保存定时发送记录
             await instance.scheduler.stop()
             logger.info("摸鱼人日历定时任务已停止")
 
-            # 清理临时文件
-            if hasattr(instance, "temp_dir") and os.path.exists(instance.temp_dir):
-                for file in os.listdir(instance.temp_dir):
-                    try:
-                        os.remove(os.path.join(instance.temp_dir, file))
-                    except Exception as e:
-                        logger.error(f"删除临时文件失败: {str(e)}")
-                try:
-                    os.rmdir(instance.temp_dir)
-                    logger.info("已清理摸鱼人插件临时文件")
-                except Exception as e:
-                    logger.error(f"删除临时目录失败: {str(e)}")
+            # 停止指标导出，并最后导出一次
+            if instance.metrics_exporter:
+                await instance.metrics_exporter.stop()
+
+            # 写入尚未保存的群组设置
+            await instance.config_manager.close()
+
+            # 关闭共享的HTTP会话
+            await instance.image_manager.close()
+            # 图片存储目录保留到下次启动，由存储自身按LRU淘汰
         except Exception as e:
             logger.error(f"终止插件时出错: {str(e)}")
             logger.error(traceback.format_exc())
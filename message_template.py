@@ -0,0 +1,89 @@
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from astrbot.api import logger
+
+
+class MessageTemplate:
+    """预编译的消息模板
+
+    模板在加载时解析和校验一次。{time} 只精确到分钟，因此同一分钟内
+    的渲染结果直接复用。
+    """
+
+    FALLBACK_FORMAT = "摸鱼人日历\n当前时间：{time}"
+    TIME_FORMAT = "%Y-%m-%d %H:%M"
+
+    __slots__ = ("name", "format", "_minute", "_text")
+
+    def __init__(self, name: str, fmt: str):
+        """编译模板
+
+        Args:
+            name: 模板名称
+            fmt: 模板格式，支持{time}变量
+
+        Raises:
+            ValueError: 模板格式不是字符串或包含无法渲染的占位符
+        """
+        if not isinstance(fmt, str):
+            raise ValueError("模板格式必须是字符串")
+        try:
+            fmt.format(time="2000-01-01 00:00")
+        except (KeyError, IndexError, ValueError, AttributeError) as e:
+            raise ValueError(f"模板格式无法渲染: {type(e).__name__} {str(e)}")
+
+        self.name = name
+        self.format = fmt
+        self._minute: Optional[int] = None
+        self._text = ""
+
+    @classmethod
+    def from_config(cls, template: Any) -> "MessageTemplate":
+        """从配置项编译模板，配置项可以是字典或JSON字符串
+
+        Raises:
+            ValueError: 配置项格式无效
+        """
+        if isinstance(template, str):
+            try:
+                template = json.loads(template)
+            except json.JSONDecodeError:
+                raise ValueError("无法解析模板字符串")
+        if not isinstance(template, dict) or "format" not in template:
+            raise ValueError("模板缺少format字段")
+        return cls(template.get("name", "未命名模板"), template["format"])
+
+    def render(self, now: datetime) -> str:
+        """渲染模板，同一分钟内返回缓存的结果"""
+        minute = now.toordinal() * 1440 + now.hour * 60 + now.minute
+        if minute != self._minute:
+            self._text = self.format.format(time=now.strftime(self.TIME_FORMAT))
+            self._minute = minute
+        return self._text
+
+
+def compile_templates(
+    templates: List[Any], default_template: Dict[str, Any]
+) -> List[MessageTemplate]:
+    """编译模板列表，无效模板在此时记录并忽略
+
+    Returns:
+        List[MessageTemplate]: 至少包含一个模板；没有有效模板时使用默认模板
+    """
+    compiled = []
+    for index, template in enumerate(templates):
+        try:
+            compiled.append(MessageTemplate.from_config(template))
+        except ValueError as e:
+            logger.error(f"第 {index + 1} 个消息模板无效，已忽略: {str(e)}: {template}")
+
+    if compiled:
+        return compiled
+
+    logger.warning("没有有效的模板，使用默认模板")
+    try:
+        return [MessageTemplate.from_config(default_template)]
+    except ValueError as e:
+        logger.error(f"默认模板无效，使用内置模板: {str(e)}")
+        return [MessageTemplate("默认样式", MessageTemplate.FALLBACK_FORMAT)]
@@ -0,0 +1,327 @@
+import abc
+import asyncio
+import bisect
+import os
+from typing import Dict, List, Optional, Sequence, Tuple
+from astrbot.api import logger
+
+# 延迟直方图的默认分桶（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class _CounterChild:
+    """带固定标签值的计数器，热路径上只做一次加法"""
+
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+
+class Counter:
+    """按标签分组的单调递增计数器"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._children: Dict[Tuple[str, ...], _CounterChild] = {}
+
+    def labels(self, *values: str) -> _CounterChild:
+        """获取指定标签值的计数器，可以保存下来重复使用"""
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = _CounterChild()
+        return child
+
+    def inc(self, *values: str, amount: float = 1) -> None:
+        self.labels(*values).inc(amount)
+
+    def samples(self) -> List[Tuple[str, Tuple[str, ...], float]]:
+        return [(self.name, values, child.value) for values, child in self._children.items()]
+
+    def total(self) -> float:
+        return sum(child.value for child in self._children.values())
+
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """按分桶上界估算分位数，落在最后一个桶时返回最大的分桶上界"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return self.buckets[min(index, len(self.buckets) - 1)]
+        return self.buckets[-1]
+
+
+class Histogram:
+    """按标签分组的延迟直方图"""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._children: Dict[Tuple[str, ...], _HistogramChild] = {}
+
+    def labels(self, *values: str) -> _HistogramChild:
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = _HistogramChild(self.buckets)
+        return child
+
+    def observe(self, value: float, *values: str) -> None:
+        self.labels(*values).observe(value)
+
+    def samples(self) -> List[Tuple[str, Tuple[str, ...], float]]:
+        result = []
+        for values, child in self._children.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                result.append((f"{self.name}_bucket", values + (le,), cumulative))
+            result.append((f"{self.name}_sum", values, child.sum))
+            result.append((f"{self.name}_count", values, child.count))
+        return result
+
+    def children(self) -> Dict[Tuple[str, ...], _HistogramChild]:
+        return self._children
+
+
+class MetricsRegistry:
+    """插件内的指标注册表"""
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+
+    def counter(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help_text, labels))
+
+    def histogram(
+        self,
+        name: str,
+        help_text: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, help_text, labels, buckets))
+
+    def _register(self, metric):
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render_prometheus(self) -> str:
+        """以Prometheus文本格式导出所有指标"""
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            label_names = metric.label_names
+            if metric.kind == "histogram":
+                label_names = label_names + ("le",)
+            for name, values, value in metric.samples():
+                names = label_names if name.endswith("_bucket") else metric.label_names
+                if values:
+                    labels = ",".join(
+                        f'{key}="{self._escape(val)}"' for key, val in zip(names, values)
+                    )
+                    lines.append(f"{name}{{{labels}}} {value:g}")
+                else:
+                    lines.append(f"{name} {value:g}")
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _escape(value: str) -> str:
+        return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+REGISTRY = MetricsRegistry()
+
+FETCH_SECONDS = REGISTRY.histogram(
+    "moyu_fetch_seconds", "从API端点下载图片的耗时", ("endpoint", "outcome")
+)
+IMAGE_CACHE = REGISTRY.counter("moyu_image_cache_total", "图片缓存查询次数", ("result",))
+RENDER_SECONDS = REGISTRY.histogram(
+    "moyu_render_seconds",
+    "渲染消息模板的耗时",
+    buckets=(0.00001, 0.0001, 0.001, 0.01, 0.1),
+)
+SEND_SECONDS = REGISTRY.histogram(
+    "moyu_send_seconds", "向会话发送消息的耗时", ("platform", "outcome")
+)
+SCHEDULE_LATENESS = REGISTRY.histogram(
+    "moyu_schedule_lateness_seconds",
+    "定时发送的实际时间与计划时间之差",
+    buckets=(0.1, 0.5, 1, 2, 5, 10, 30, 60, 300),
+)
+CATCH_UP = REGISTRY.counter(
+    "moyu_catch_up_total", "过期定时任务的处理次数", ("action",)
+)
+CLOCK_JUMPS = REGISTRY.counter("moyu_clock_jumps_total", "检测到的系统时间跳变次数")
+TRIGGER_MESSAGES = REGISTRY.counter(
+    "moyu_trigger_messages_total", "触发词检测的消息数", ("result",)
+)
+
+# 热路径上使用的固定标签计数器
+TRIGGER_FILTERED = TRIGGER_MESSAGES.labels("filtered")
+TRIGGER_UNMATCHED = TRIGGER_MESSAGES.labels("unmatched")
+TRIGGER_LIMITED = TRIGGER_MESSAGES.labels("limited")
+TRIGGER_MATCHED = TRIGGER_MESSAGES.labels("matched")
+CACHE_HIT = IMAGE_CACHE.labels("hit")
+CACHE_MISS = IMAGE_CACHE.labels("miss")
+
+
+def delivery_hook(stage: str, elapsed: float, ok: bool, target: Optional[str]) -> None:
+    """发送流程的阶段钩子，记录渲染与发送耗时"""
+    if stage == "render":
+        RENDER_SECONDS.observe(elapsed)
+    elif stage == "send" and target:
+        platform = target.split(":", 1)[0]
+        SEND_SECONDS.observe(elapsed, platform, "ok" if ok else "error")
+
+
+def format_summary() -> str:
+    """生成 /moyu_stats 命令显示的指标摘要"""
+    lines = ["📊 摸鱼人运行指标"]
+
+    fetches = FETCH_SECONDS.children()
+    if fetches:
+        lines.append("图片下载:")
+        for (endpoint, outcome), child in sorted(fetches.items()):
+            lines.append(
+                f"  {endpoint} [{outcome}] {child.count}次，"
+                f"平均{child.sum / child.count:.2f}秒，p95≤{child.quantile(0.95):g}秒"
+            )
+
+    hits, misses = CACHE_HIT.value, CACHE_MISS.value
+    if hits + misses:
+        lines.append(f"图片缓存: 命中{hits}次，未命中{misses}次，命中率{hits / (hits + misses):.1%}")
+
+    render = RENDER_SECONDS.labels()
+    if render.count:
+        lines.append(
+            f"模板渲染: {render.count}次，平均{render.sum / render.count * 1e6:.1f}微秒"
+        )
+
+    sends = SEND_SECONDS.children()
+    if sends:
+        lines.append("消息发送:")
+        for (platform, outcome), child in sorted(sends.items()):
+            lines.append(
+                f"  {platform} [{outcome}] {child.count}次，"
+                f"平均{child.sum / child.count:.2f}秒，p95≤{child.quantile(0.95):g}秒"
+            )
+
+    lateness = SCHEDULE_LATENESS.labels()
+    if lateness.count:
+        lines.append(
+            f"定时延迟: {lateness.count}次，平均{lateness.sum / lateness.count:.2f}秒，"
+            f"p95≤{lateness.quantile(0.95):g}秒"
+        )
+
+    if CATCH_UP.total() or CLOCK_JUMPS.total():
+        lines.append(
+            f"过期任务: 补发{CATCH_UP.labels('late_sent').value:.0f}个，"
+            f"跳过{CATCH_UP.labels('skipped').value:.0f}个，"
+            f"时间跳变{CLOCK_JUMPS.total():.0f}次"
+        )
+
+    total = TRIGGER_MESSAGES.total()
+    if total:
+        lines.append(
+            f"触发词检测: {total:.0f}条消息，预筛选排除{TRIGGER_FILTERED.value}条，"
+            f"未命中{TRIGGER_UNMATCHED.value}条，限流{TRIGGER_LIMITED.value}条，"
+            f"响应{TRIGGER_MATCHED.value}条（命中率{TRIGGER_MATCHED.value / total:.2%}）"
+        )
+
+    if len(lines) == 1:
+        lines.append("暂无数据")
+    return "\n".join(lines)
+
+
+class MetricsExporter(abc.ABC):
+    """指标导出器基类，按固定间隔调用 export"""
+
+    def __init__(self, registry: MetricsRegistry, interval: float):
+        self.registry = registry
+        self.interval = max(interval, 1)
+        self.task_ref: Optional[asyncio.Task] = None
+
+    @abc.abstractmethod
+    async def export(self) -> None:
+        """导出一次当前指标"""
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.export()
+            except Exception as e:
+                logger.error(f"导出指标失败: {str(e)}")
+
+    def start(self) -> None:
+        if not self.task_ref:
+            self.task_ref = asyncio.get_event_loop().create_task(self._loop())
+
+    async def stop(self) -> None:
+        """停止定时导出，并最后导出一次"""
+        if self.task_ref:
+            self.task_ref.cancel()
+            self.task_ref = None
+        try:
+            await self.export()
+        except Exception as e:
+            logger.error(f"导出指标失败: {str(e)}")
+
+
+class PrometheusFileExporter(MetricsExporter):
+    """把指标以Prometheus文本格式写入文件，供node_exporter的textfile收集器读取"""
+
+    def __init__(self, registry: MetricsRegistry, path: str, interval: float = 60):
+        super().__init__(registry, interval)
+        self.path = path
+
+    async def export(self) -> None:
+        text = self.registry.render_prometheus()
+        await asyncio.to_thread(self._write, text)
+
+    def _write(self, text: str) -> None:
+        # 先写临时文件再替换，避免收集器读到写了一半的文件
+        temp_file = f"{self.path}.tmp"
+        with open(temp_file, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(temp_file, self.path)
@@ -0,0 +1,198 @@
+import asyncio
+import time
+from typing import Dict, Optional, Set
+
+
+class TokenBucket:
+    """令牌桶限速器"""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        """初始化令牌桶
+
+        Args:
+            rate: 每秒补充的令牌数
+            capacity: 桶容量，即允许的突发数量，默认等于rate且至少为1
+        """
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self.updated
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+            self.updated = now
+
+    def available(self, now: float) -> bool:
+        """是否至少有一个令牌可用，不取出令牌"""
+        self._refill(now)
+        return self.tokens >= 1
+
+    def is_full(self, now: float) -> bool:
+        """令牌是否已经补满；补满的桶与新建的桶等价，可以安全回收"""
+        return self.tokens + (now - self.updated) * self.rate >= self.capacity
+
+    def try_acquire(self, now: Optional[float] = None) -> bool:
+        """尝试取出一个令牌，不等待
+
+        Returns:
+            bool: 是否取得令牌
+        """
+        self._refill(time.monotonic() if now is None else now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def delay(self) -> float:
+        """距离下一个令牌可用还需等待的秒数"""
+        self._refill(time.monotonic())
+        if self.tokens >= 1 or self.rate <= 0:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    async def acquire(self) -> None:
+        """取出一个令牌，令牌不足时等待补充"""
+        if self.rate <= 0:
+            return
+        while not self.try_acquire():
+            await asyncio.sleep(self.delay())
+
+
+class PlatformRateLimiter:
+    """按消息平台分别限速，用于批量发送"""
+
+    def __init__(self, default_rate: float, overrides: Optional[Dict[str, float]] = None):
+        """初始化平台限速器
+
+        Args:
+            default_rate: 每个平台每秒最多发送的消息数，0表示不限制
+            overrides: 指定平台的限速，键为平台名
+        """
+        self.default_rate = default_rate
+        self.overrides = overrides or {}
+        self._buckets: Dict[str, TokenBucket] = {}
+
+    @staticmethod
+    def platform_of(session_id: str) -> str:
+        """从会话ID（平台名:消息类型:会话）中取出平台名"""
+        return session_id.split(":", 1)[0]
+
+    async def acquire(self, session_id: str) -> None:
+        """等待向指定会话所在平台发送的配额"""
+        platform = self.platform_of(session_id)
+        rate = self.overrides.get(platform, self.default_rate)
+        if rate <= 0:
+            return
+        bucket = self._buckets.get(platform)
+        if bucket is None:
+            bucket = self._buckets[platform] = TokenBucket(rate)
+        await bucket.acquire()
+
+
+class TriggerRateLimiter:
+    """触发词响应限流：按会话、按用户和全局三级令牌桶
+
+    同一会话已有响应正在发送时，新的触发会被合并（直接丢弃）。补满的
+    令牌桶与新建的桶等价，定期回收，使内存占用只与近期活跃的会话数相关。
+    """
+
+    SWEEP_INTERVAL = 60.0
+
+    def __init__(self, config: Dict):
+        """初始化触发词限流器
+
+        Args:
+            config: 从_conf_schema.json加载的配置
+        """
+        # 会话冷却时间（秒）：每个会话每隔多久最多响应一次
+        cooldown = config.get("trigger_session_cooldown", 10)
+        self.session_rate = 1.0 / cooldown if cooldown > 0 else 0.0
+        # 单个用户每分钟最多触发的次数
+        self.user_rate = config.get("trigger_user_rate_per_minute", 3) / 60.0
+        self.user_capacity = max(config.get("trigger_user_rate_per_minute", 3), 1)
+        # 全局每秒最多响应的次数
+        global_rate = config.get("trigger_global_rate_per_second", 5)
+        self.global_bucket = TokenBucket(global_rate) if global_rate > 0 else None
+
+        self._sessions: Dict[str, TokenBucket] = {}
+        self._users: Dict[str, TokenBucket] = {}
+        self._inflight: Set[str] = set()
+        self._last_sweep = time.monotonic()
+        self.counters: Dict[str, int] = {
+            "allowed": 0,
+            "coalesced": 0,
+            "dropped_session": 0,
+            "dropped_user": 0,
+            "dropped_global": 0,
+        }
+
+    def allow(self, session_id: str, user_id: Optional[str]) -> bool:
+        """判断本次触发是否允许响应，允许时扣除各级令牌并标记为发送中
+
+        允许后必须调用 release 结束发送状态。
+        """
+        now = time.monotonic()
+        if now - self._last_sweep >= self.SWEEP_INTERVAL:
+            self._sweep(now)
+
+        if session_id in self._inflight:
+            self.counters["coalesced"] += 1
+            return False
+
+        session_bucket = None
+        if self.session_rate > 0:
+            session_bucket = self._sessions.get(session_id)
+            if session_bucket is None:
+                session_bucket = self._sessions[session_id] = TokenBucket(
+                    self.session_rate, 1
+                )
+            if not session_bucket.available(now):
+                self.counters["dropped_session"] += 1
+                return False
+
+        user_bucket = None
+        if self.user_rate > 0 and user_id:
+            user_key = f"{session_id}/{user_id}"
+            user_bucket = self._users.get(user_key)
+            if user_bucket is None:
+                user_bucket = self._users[user_key] = TokenBucket(
+                    self.user_rate, self.user_capacity
+                )
+            if not user_bucket.available(now):
+                self.counters["dropped_user"] += 1
+                return False
+
+        if self.global_bucket and not self.global_bucket.available(now):
+            self.counters["dropped_global"] += 1
+            return False
+
+        # 所有级别都有令牌时才统一扣除，避免被拒绝的触发消耗其他级别的配额
+        for bucket in (session_bucket, user_bucket, self.global_bucket):
+            if bucket:
+                bucket.tokens -= 1
+        self._inflight.add(session_id)
+        self.counters["allowed"] += 1
+        return True
+
+    def release(self, session_id: str) -> None:
+        """结束会话的发送状态"""
+        self._inflight.discard(session_id)
+
+    def _sweep(self, now: float) -> None:
+        """回收已补满的令牌桶"""
+        for buckets in (self._sessions, self._users):
+            for key in [k for k, bucket in buckets.items() if bucket.is_full(now)]:
+                del buckets[key]
+        self._last_sweep = now
+
+    def stats(self) -> Dict[str, int]:
+        """获取限流计数和当前跟踪的会话、用户数"""
+        return {
+            **self.counters,
+            "tracked_sessions": len(self._sessions),
+            "tracked_users": len(self._users),
+        }
@@ -0,0 +1,157 @@
+import json
+import re
+from datetime import date, datetime, timedelta, tzinfo
+from typing import FrozenSet, Iterable, List, Optional, Tuple
+from astrbot.api import logger
+
+from .timezones import local_to_utc, to_local
+
+
+class HolidayCalendar:
+    """节假日日历：法定节假日不发送，调休上班日按工作日发送
+
+    日历文件为JSON，格式为 {"holidays": ["2025-10-01", ...], "workdays": ["2025-09-28", ...]}
+    """
+
+    def __init__(self, holidays: Iterable[date] = (), workdays: Iterable[date] = ()):
+        self.holidays: FrozenSet[date] = frozenset(holidays)
+        self.workdays: FrozenSet[date] = frozenset(workdays)
+
+    @classmethod
+    def load(cls, path: str) -> "HolidayCalendar":
+        """从JSON文件加载日历
+
+        Raises:
+            ValueError: 文件格式或日期无效
+            OSError: 文件无法读取
+        """
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if not isinstance(data, dict):
+            raise ValueError("日历文件格式错误：期望包含holidays和workdays的对象")
+        return cls(
+            (date.fromisoformat(day) for day in data.get("holidays", [])),
+            (date.fromisoformat(day) for day in data.get("workdays", [])),
+        )
+
+
+class ScheduleRule:
+    """编译后的会话发送规则：一天中的多个发送时间、星期掩码与节假日日历
+
+    规则在会话设置变化时编译一次，计算下一次发送时间时只需逐日检查。
+    """
+
+    # 工作日模式：周一至周五，配合日历跳过节假日并在调休日发送
+    WORKDAY = "workday"
+    DAILY = "daily"
+    # 向后查找的最大天数，星期掩码与日历的组合在一年内必然出现发送日
+    MAX_LOOKAHEAD_DAYS = 400
+
+    __slots__ = ("times", "weekdays", "workday", "zone", "calendar")
+
+    def __init__(
+        self,
+        times: List[Tuple[int, int]],
+        weekdays: Optional[FrozenSet[int]] = None,
+        workday: bool = False,
+        zone: Optional[tzinfo] = None,
+        calendar: Optional[HolidayCalendar] = None,
+    ):
+        """构建规则
+
+        Args:
+            times: 按时间排序的 (小时, 分钟) 列表
+            weekdays: 发送的星期（1为周一，7为周日），None表示每天
+            workday: 是否为工作日模式
+            zone: 会话所在时区，None表示系统本地时区
+            calendar: 节假日日历，只对设置了星期的规则生效
+        """
+        self.times = times
+        self.weekdays = weekdays
+        self.workday = workday
+        self.zone = zone
+        self.calendar = calendar
+
+    @staticmethod
+    def parse_times(text: str) -> List[Tuple[int, int]]:
+        """解析逗号分隔的 HH:MM 时间列表，返回去重排序后的结果
+
+        Raises:
+            ValueError: 时间格式无效
+        """
+        times = set()
+        for part in re.split(r"[,，]", text):
+            part = part.strip()
+            if not part:
+                continue
+            hour, minute = map(int, part.split(":"))
+            if not (0 <= hour < 24 and 0 <= minute < 60):
+                raise ValueError(f"时间超出范围: {part}")
+            times.add((hour, minute))
+        if not times:
+            raise ValueError("没有设置发送时间")
+        return sorted(times)
+
+    @staticmethod
+    def format_times(times: List[Tuple[int, int]]) -> str:
+        return ",".join(f"{hour:02d}:{minute:02d}" for hour, minute in times)
+
+    @classmethod
+    def parse_weekdays(cls, text: Optional[str]) -> Tuple[Optional[FrozenSet[int]], bool]:
+        """解析星期设置：daily、workday，或 1-5、1,3,5 形式的星期列表
+
+        Returns:
+            Tuple: (发送的星期，None表示每天；是否为工作日模式)
+
+        Raises:
+            ValueError: 星期设置无效
+        """
+        text = (text or cls.DAILY).strip().lower()
+        if text == cls.DAILY:
+            return None, False
+        if text == cls.WORKDAY:
+            return frozenset(range(1, 6)), True
+
+        days = set()
+        for part in re.split(r"[,，]", text):
+            part = part.strip()
+            if not part:
+                continue
+            if "-" in part:
+                start, end = map(int, part.split("-", 1))
+                days.update(range(start, end + 1))
+            else:
+                days.add(int(part))
+        if not days or not days <= set(range(1, 8)):
+            raise ValueError("星期设置无效，请使用 1-7（1为周一），如 1-5 或 1,3,5")
+        return frozenset(days), False
+
+    def runs_on(self, day: date) -> bool:
+        """判断某个当地日期是否发送"""
+        if self.weekdays is None:
+            return True
+        calendar = self.calendar
+        if calendar is not None:
+            if day in calendar.holidays:
+                return False
+            if self.workday and day in calendar.workdays:
+                return True
+        return day.isoweekday() in self.weekdays
+
+    def next_after(self, now: datetime) -> Optional[datetime]:
+        """计算now之后的下一次发送时间（UTC）
+
+        Args:
+            now: 当前的UTC时间
+        """
+        today = to_local(now, self.zone).date()
+        for offset in range(self.MAX_LOOKAHEAD_DAYS):
+            day = today + timedelta(days=offset)
+            if not self.runs_on(day):
+                continue
+            for hour, minute in self.times:
+                exec_time = local_to_utc(day, hour, minute, self.zone)
+                if exec_time > now:
+                    return exec_time
+        logger.warning("按当前星期与节假日设置，一年内没有需要发送的日期")
+        return None
@@ -1,12 +1,19 @@
 import asyncio
-from datetime import datetime, timedelta
-import heapq
+from datetime import datetime, timedelta, date, tzinfo
+import os
+import time
 from astrbot.api import logger
 import traceback
-from astrbot.api.event import MessageChain
-from typing import List, Tuple, Optional
+from typing import List, Tuple, Optional, Dict
 from functools import wraps
 
+from .delivery import DeliveryPipeline
+from .delivery_ledger import DeliveryKey, DeliveryLedger
+from .schedule_rules import HolidayCalendar, ScheduleRule
+from .timezones import get_zone, to_local, utc_now
+from .metrics import CATCH_UP, CLOCK_JUMPS, SCHEDULE_LATENESS
+from .task_queue import IndexedTaskQueue, MinuteBucketQueue
+
 
 def scheduler_error_handler(func):
     """调度器错误处理装饰器"""
@@ -20,64 +27,248 @@ def scheduler_error_handler(func):
         except Exception as e:
             logger.error(f"{func.__name__} 执行出错: {str(e)}")
             logger.error(traceback.format_exc())
-            # 出错后等待一段时间再继续
-            await asyncio.sleep(60)
+            # 不在这里等待，避免一次出错推迟后续任务；循环自行退避
             return None
 
     return wrapper
 
 
 class Scheduler:
-    def __init__(self, config_manager, image_manager, context):
+    # 分段等待的最长时间（秒），每段结束后重新检查系统时间
+    MAX_WAIT_CHUNK = 30.0
+    # 系统时间与单调时钟相差超过该值（秒）时视为时间跳变
+    CLOCK_JUMP_THRESHOLD = 2.0
+
+    # 补发策略：send 照常补发；skip 跳过过期任务。
+    # 任务队列中每个会话只有一个任务，过期任务本身就只会补发一次
+    CATCH_UP_SEND = "send"
+    CATCH_UP_SKIP = "skip"
+
+    def __init__(
+        self,
+        config_manager,
+        image_manager,
+        context,
+        config: Dict = None,
+        delivery: Optional[DeliveryPipeline] = None,
+        ledger: Optional[DeliveryLedger] = None,
+    ):
         self.config_manager = config_manager
         self.image_manager = image_manager
         self.context = context
-        self.task_queue: List[Tuple[datetime, str]] = []
+        self.config = config or {}
+        # 调度引擎：heap 为按目标索引的最小堆，wheel 为按分钟分桶的时间轮
+        self.engine = self.config.get("scheduler_engine", "heap")
+        if self.engine == "wheel":
+            self.task_queue = MinuteBucketQueue()
+        else:
+            self.task_queue = IndexedTaskQueue()
         self.wakeup_event = asyncio.Event()
         self.scheduled_task_ref: Optional[asyncio.Task] = None
 
-    def update_task_queue(self) -> None:
-        """更新任务队列"""
-        # 清空当前队列
-        self.task_queue = []
+        # 过期任务的补发策略，延迟不超过宽限时间（秒）的任务总是正常发送
+        self.catch_up_policy = self.config.get("catch_up_policy", self.CATCH_UP_SEND)
+        if self.catch_up_policy not in (self.CATCH_UP_SEND, self.CATCH_UP_SKIP):
+            logger.warning(f"未知的补发策略 {self.catch_up_policy}，使用send")
+            self.catch_up_policy = self.CATCH_UP_SEND
+        self.catch_up_grace = self.config.get("catch_up_grace", 300)
+
+        # 定时发送记录：重启后补发停机期间错过的发送，并避免重复发送
+        self.ledger = ledger
+        self.replay_window = self.config.get("replay_window", 3600)
+        self._last_checkpoint = 0.0
+        # 正在执行的批次中最早的计划时间，检查点不能晚于它
+        self._running_batch_time: Optional[datetime] = None
+
+        # 图片预取：在最早的定时任务前提前下载当天图片
+        self.prefetch_lead_time = self.config.get("prefetch_lead_time", 300)
+        self.prefetch_max_retries = self.config.get("prefetch_max_retries", 5)
+        self.prefetch_retry_backoff = self.config.get("prefetch_retry_backoff", 10)
+        self.prefetch_event = asyncio.Event()
+        self.prefetch_task_ref: Optional[asyncio.Task] = None
+        self._prefetched_date: Optional[date] = None
+
+        # 统一的发送流程，负责批量发送的并发与平台限速
+        self.delivery = delivery or DeliveryPipeline(image_manager, context, self.config)
+        self.last_batch_stats: Dict = {}
+
+        # 未单独设置时区的会话使用的默认时区，留空为系统本地时区。
+        # 任务队列中的时间统一为UTC，不同时区的会话共用同一个队列
+        try:
+            self.default_zone = get_zone(self.config.get("default_timezone", ""))
+        except ValueError as e:
+            logger.error(f"{str(e)}，使用系统本地时区")
+            self.default_zone = None
+        self._invalid_zones = set()
+
+        # 编译后的会话发送规则，键为会话ID，值为 (相关设置, 规则)
+        self._rules: Dict[str, Tuple[tuple, Optional[ScheduleRule]]] = {}
+        # 节假日日历：设置了星期的会话跳过节假日，工作日模式在调休日发送
+        self.calendar: Optional[HolidayCalendar] = None
+        calendar_file = self.config.get("holiday_calendar_file", "")
+        if calendar_file:
+            if not os.path.isabs(calendar_file):
+                calendar_file = os.path.join(os.path.dirname(__file__), calendar_file)
+            try:
+                self.calendar = HolidayCalendar.load(calendar_file)
+                logger.info(
+                    f"已加载节假日日历: {len(self.calendar.holidays)}个节假日，"
+                    f"{len(self.calendar.workdays)}个调休日"
+                )
+            except (OSError, ValueError) as e:
+                logger.error(f"加载节假日日历失败: {str(e)}")
 
-        # 获取当前时间
-        now = datetime.now()
+    def _compute_next_time(self, target: str, now: datetime) -> Optional[datetime]:
+        """根据群组时间设置计算下一次执行时间（UTC），未设置时间时返回None
 
-        # 遍历所有群组设置
-        for target, settings in self.config_manager.group_settings.items():
+        Args:
+            target: 会话ID
+            now: 当前的UTC时间
+        """
+        settings = self.config_manager.group_settings.get(target)
+        # 检查是否有自定义时间设置
+        if not isinstance(settings, dict) or "custom_time" not in settings:
+            return None
+
+        rule = self._rule_for(target, settings)
+        if rule is None:
+            return None
+        return rule.next_after(now)
+
+    def _rule_for(self, target: str, settings: Dict) -> Optional[ScheduleRule]:
+        """获取会话编译后的发送规则，相关设置未变化时复用缓存"""
+        key = (settings["custom_time"], settings.get("weekdays"), settings.get("timezone"))
+        cached = self._rules.get(target)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+
+        try:
+            weekdays, workday = ScheduleRule.parse_weekdays(settings.get("weekdays"))
+            rule = ScheduleRule(
+                ScheduleRule.parse_times(settings["custom_time"]),
+                weekdays,
+                workday,
+                self.zone_of(settings),
+                self.calendar,
+            )
+        except ValueError as e:
+            logger.error(f"群 {target} 的时间设置无效: {str(e)}")
+            rule = None
+        self._rules[target] = (key, rule)
+        return rule
+
+    def zone_of(self, settings: Dict) -> Optional[tzinfo]:
+        """获取会话的时区，未设置或无效时使用默认时区"""
+        name = settings.get("timezone")
+        if name and name not in self._invalid_zones:
             try:
-                # 检查是否有自定义时间设置
-                if not isinstance(settings, dict) or "custom_time" not in settings:
-                    continue
+                return get_zone(name)
+            except ValueError as e:
+                # 每个无效的时区名称只报告一次
+                self._invalid_zones.add(name)
+                logger.error(f"{str(e)}，使用默认时区")
+        return self.default_zone
 
-                # 解析时间设置
-                time_str = settings["custom_time"]
-                try:
-                    hour, minute = map(int, time_str.split(":"))
-                except ValueError:
-                    logger.error(f"无效的时间格式: {time_str}")
-                    continue
+    def schedule_target(self, target: str) -> Optional[datetime]:
+        """增量调度单个目标：添加、重新调度或在未设置时间时取消
 
-                # 计算今天的执行时间点
-                today_exec_time = now.replace(
-                    hour=hour, minute=minute, second=0, microsecond=0
-                )
+        Returns:
+            Optional[datetime]: 下一次执行时间，未调度时返回None
+        """
+        next_time = self._compute_next_time(target, utc_now())
+        if next_time is None:
+            self.task_queue.remove(target)
+        else:
+            self.task_queue.push(target, next_time)
+        # 最早的任务可能已变化，通知预取任务重新计算
+        self.prefetch_event.set()
+        return next_time
+
+    def _ledger_key(
+        self, target: str, scheduled_time: datetime, zone: Optional[tzinfo]
+    ) -> DeliveryKey:
+        """一次定时发送在记录中的标识：会话ID与计划时间的当地日期、时刻"""
+        local = to_local(scheduled_time, zone)
+        return target, local.date().isoformat(), f"{local:%H:%M}"
+
+    def _find_missed(
+        self, target: str, since: datetime, now: datetime
+    ) -> Tuple[Optional[datetime], int]:
+        """查找不早于since、不晚于now的错过的定时发送
+
+        Returns:
+            Tuple: (需要补发的最近一次计划时间，没有时为None；状态不确定而不补发的次数)
+        """
+        settings = self.config_manager.group_settings.get(target)
+        if not isinstance(settings, dict) or "custom_time" not in settings:
+            return None, 0
+        rule = self._rule_for(target, settings)
+        if rule is None:
+            return None, 0
+
+        missed, ambiguous = None, 0
+        # 检查点本身的时刻可能还未发送，因此从检查点开始（含）查找
+        scheduled_time = rule.next_after(since - timedelta(microseconds=1))
+        while scheduled_time is not None and scheduled_time <= now:
+            state = self.ledger.state_of(self._ledger_key(target, scheduled_time, rule.zone))
+            if state == DeliveryLedger.SENDING:
+                # 停机时正在发送，可能已经送达，不重发
+                ambiguous += 1
+            elif state != DeliveryLedger.DONE:
+                missed = scheduled_time
+            scheduled_time = rule.next_after(scheduled_time)
+        return missed, ambiguous
+
+    def update_task_queue(self) -> None:
+        """根据全部群组设置重建任务队列，用于启动时初始化
+
+        有定时发送记录时，把停机期间错过的发送作为过期任务加入队列，
+        之后按补发策略处理；每个会话最多补发最近的一次。
+        """
+        # 清空当前队列
+        self.task_queue.clear()
 
-                # 如果今天的时间已经过去，调整到明天
-                if today_exec_time <= now:
-                    today_exec_time = (now + timedelta(days=1)).replace(
-                        hour=hour, minute=minute, second=0, microsecond=0
-                    )
+        # 获取当前时间
+        now = utc_now()
+
+        # 只补发检查点之后（含）、补发窗口之内错过的发送；首次运行没有记录，不补发
+        # 补发的任务按过期任务处理；skip 策略会跳过超过宽限时间的任务，
+        # 因此只补发宽限时间内错过的发送
+        window = self.replay_window
+        if self.catch_up_policy == self.CATCH_UP_SKIP:
+            window = min(window, self.catch_up_grace)
+        since = None
+        if self.ledger is not None and window > 0 and self.ledger.checkpoint:
+            since = max(self.ledger.checkpoint, now - timedelta(seconds=window))
+        replayed = ambiguous = 0
 
-                # 添加到优先队列
-                heapq.heappush(self.task_queue, (today_exec_time, target))
+        # 遍历所有群组设置
+        for target in self.config_manager.group_settings:
+            try:
+                next_time = self._compute_next_time(target, now)
+                if since is not None:
+                    missed, skipped = self._find_missed(target, since, now)
+                    ambiguous += skipped
+                    if missed is not None:
+                        next_time = missed
+                        replayed += 1
+                if next_time:
+                    self.task_queue.push(target, next_time)
             except ValueError as e:
                 logger.error(f"解析群 {target} 的时间设置出错: {str(e)}")
             except Exception as e:
                 logger.error(f"处理群 {target} 的任务时出错: {str(e)}")
                 logger.error(traceback.format_exc())
 
+        if replayed or ambiguous:
+            logger.warning(
+                f"停机期间错过的定时发送: 补发{replayed}个，"
+                f"停机时正在发送、可能已送达而不重发{ambiguous}个"
+            )
+
+        # 最早的任务可能已变化，通知预取任务重新计算
+        self.prefetch_event.set()
+
     def normalize_session_id(self, target: str) -> str:
         """标准化会话ID格式"""
         try:
@@ -92,88 +283,187 @@ class Scheduler:
             return target  # 返回原始ID作为后备
 
     @scheduler_error_handler
-    async def _execute_task(self, target: str, scheduled_time: datetime) -> None:
-        """执行定时任务"""
-        try:
-            now = datetime.now()
-
-            # 标准化目标ID
+    async def _execute_batch(self, batch: List[Tuple[datetime, str]]) -> None:
+        """批量执行同一时刻到期的定时任务"""
+        now = utc_now()
+
+        # 筛选仍然有效的目标，并把它们重新加入明天的队列
+        # 按时区分组，消息中的时间使用会话所在时区的当地时间
+        groups: Dict[Optional[tzinfo], List[str]] = {}
+        keys: Dict[str, DeliveryKey] = {}
+        max_lateness = 0.0
+        for scheduled_time, target in batch:
             normalized_target = self.normalize_session_id(target)
-
-            # 检查群组设置
-            if normalized_target not in self.config_manager.group_settings:
-                return
-
-            settings = self.config_manager.group_settings[normalized_target]
+            settings = self.config_manager.group_settings.get(normalized_target)
             if not isinstance(settings, dict) or "custom_time" not in settings:
-                return
-
-            # 获取并发送图片
-            image_path = await self.image_manager.get_moyu_image()
-            if not image_path:
-                logger.error(f"获取摸鱼人日历图片失败")
-                return
-
-            current_datetime = now.strftime("%Y-%m-%d %H:%M")
+                continue
+            next_time = self._compute_next_time(normalized_target, now)
+            if next_time:
+                self.task_queue.push(target, next_time)
+            zone = self.zone_of(settings)
+            if self.ledger is not None:
+                key = self._ledger_key(normalized_target, scheduled_time, zone)
+                if self.ledger.state_of(key) in (DeliveryLedger.SENDING, DeliveryLedger.DONE):
+                    logger.info(f"群 {normalized_target} 在 {key[1]} {key[2]} 的定时发送已处理，跳过")
+                    continue
+                keys[normalized_target] = key
+            groups.setdefault(zone, []).append(normalized_target)
+            lateness = (now - scheduled_time).total_seconds()
+            SCHEDULE_LATENESS.observe(lateness)
+            max_lateness = max(max_lateness, lateness)
+
+        if not groups:
+            return
+
+        # 发送前先落盘记录，重启时据此判断哪些发送可能已经送达
+        if keys:
+            await self.ledger.mark(list(keys.values()), DeliveryLedger.SENDING)
+
+        # 图片和消息内容每个时区只准备一次，并发发送给该时区的所有目标
+        results = await asyncio.gather(
+            *(
+                self.delivery.deliver_many(targets, to_local(now, zone))
+                for zone, targets in groups.items()
+            )
+        )
+        stats = {"targets": 0, "sent": 0, "failed": 0, "skew_seconds": 0.0}
+        for (zone, targets), result in zip(groups.items(), results):
+            if result is None:
+                logger.error(f"获取摸鱼人日历图片失败，跳过 {len(targets)} 个定时任务")
+                stats["targets"] += len(targets)
+                stats["failed"] += len(targets)
+                continue
+            for key in ("targets", "sent", "failed"):
+                stats[key] += result[key]
+            stats["skew_seconds"] = max(stats["skew_seconds"], result["skew_seconds"])
+
+        if keys:
+            delivered = set()
+            for result in results:
+                if result is not None:
+                    delivered.update(result["delivered"])
+            await self.ledger.mark(
+                [key for target, key in keys.items() if target not in delivered],
+                DeliveryLedger.FAILED,
+            )
+            await self.ledger.mark(
+                [keys[target] for target in delivered if target in keys],
+                DeliveryLedger.DONE,
+                checkpoint=self._checkpoint_time(utc_now()),
+            )
 
-            # 获取消息内容
-            template = self.image_manager._get_next_template()
+        if all(result is None for result in results):
+            return
 
-            # 确保模板是字典类型并包含必要的键
-            if not isinstance(template, dict) or "format" not in template:
-                logger.error(f"定时任务 - 模板格式不正确")
-                template = self.image_manager.default_template
+        self.last_batch_stats = {
+            "scheduled_time": batch[0][0],
+            "max_lateness_seconds": round(max_lateness, 3),
+            **stats,
+        }
+        logger.info(
+            f"批量定时发送完成: 目标{stats['targets']}个，成功{stats['sent']}个，"
+            f"失败{stats['failed']}个，耗时跨度{stats['skew_seconds']:.2f}秒，"
+            f"最大延迟{max_lateness:.2f}秒"
+        )
 
-            try:
-                # 格式化文本
-                text = template["format"].format(time=current_datetime)
-                logger.info(f"定时任务使用模板: {template.get('name', '未命名模板')}")
-            except Exception as e:
-                logger.error(f"定时任务 - 格式化模板时出错: {str(e)}")
-                # 使用一个简单的格式作为后备
-                text = f"摸鱼人日历\n当前时间：{current_datetime}"
+    async def _wait_until(self, next_time: datetime) -> bool:
+        """等待到下一个任务的执行时间或被唤醒
 
-            # 创建消息段列表
-            from astrbot.api.message_components import Plain, Image
+        按单调时钟分段等待，每段结束后重新读取系统时间，使系统时间跳变
+        或休眠恢复后能及时按新的时间判断任务是否到期。
 
-            message_segments = [Plain(text), Image(file=image_path)]
+        Returns:
+            bool: 是否被唤醒事件打断
+        """
+        while True:
+            now = utc_now()
+            remaining = (next_time - now).total_seconds()
+            if remaining <= 0:
+                return False
 
-            # 使用send_message发送消息
-            from astrbot.api.event import MessageChain
+            started_wall, started_mono = now, time.monotonic()
+            try:
+                await asyncio.wait_for(
+                    self.wakeup_event.wait(), timeout=min(remaining, self.MAX_WAIT_CHUNK)
+                )
+                self.wakeup_event.clear()
+                return True
+            except asyncio.TimeoutError:
+                pass
+            await self._update_checkpoint()
+
+            # 系统时间的流逝与单调时钟不一致，说明系统时间被调整或进程被挂起
+            drift = (utc_now() - started_wall).total_seconds() - (
+                time.monotonic() - started_mono
+            )
+            if abs(drift) >= self.CLOCK_JUMP_THRESHOLD:
+                CLOCK_JUMPS.inc()
+                logger.warning(f"检测到系统时间跳变 {drift:+.1f} 秒，重新检查定时任务")
 
-            message_chain = MessageChain(message_segments)
+    def _checkpoint_time(self, now: datetime) -> datetime:
+        """计算可以记录的检查点：早于它的定时发送都已处理
 
-            try:
-                await self.context.send_message(normalized_target, message_chain)
-                logger.info(f"已向 {normalized_target} 发送摸鱼人日历")
-            except Exception as e:
-                logger.error(f"向 {normalized_target} 发送消息失败：{str(e)}")
-                logger.error(traceback.format_exc())
-                return
+        检查点不晚于队列中最早的任务和正在执行的批次，已到期但尚未发送的
+        任务在重启后仍会被补发。
+        """
+        checkpoint = now
+        head = self.task_queue.peek()
+        if head is not None:
+            checkpoint = min(checkpoint, head[0])
+        if self._running_batch_time is not None:
+            checkpoint = min(checkpoint, self._running_batch_time)
+        return checkpoint
+
+    async def _update_checkpoint(self) -> None:
+        """定期记录调度器仍在运行，重启时只补发此后错过的发送"""
+        if self.ledger is None:
+            return
+        mono = time.monotonic()
+        if mono - self._last_checkpoint < self.MAX_WAIT_CHUNK:
+            return
+        self._last_checkpoint = mono
+        await self.ledger.update_checkpoint(self._checkpoint_time(utc_now()))
+
+    def _apply_catch_up(
+        self, batch: List[Tuple[datetime, str]], now: datetime
+    ) -> List[Tuple[datetime, str]]:
+        """按补发策略处理超过宽限时间的过期任务
 
-            # 计算下一次执行时间
-            try:
-                hour, minute = map(int, settings["custom_time"].split(":"))
-                next_time = (now + timedelta(days=1)).replace(
-                    hour=hour, minute=minute, second=0, microsecond=0
+        Returns:
+            List[Tuple[datetime, str]]: 需要发送的任务
+        """
+        late = [
+            entry
+            for entry in batch
+            if (now - entry[0]).total_seconds() > self.catch_up_grace
+        ]
+        if not late:
+            return batch
+
+        if self.catch_up_policy == self.CATCH_UP_SKIP:
+            # 跳过过期任务，只把它们重新加入下一次的队列
+            for scheduled_time, target in late:
+                next_time = self._compute_next_time(
+                    self.normalize_session_id(target), now
                 )
+                if next_time:
+                    self.task_queue.push(target, next_time)
+            CATCH_UP.inc("skipped", amount=len(late))
+            logger.warning(
+                f"跳过 {len(late)} 个过期的定时任务，最早计划时间 "
+                f"{min(entry[0] for entry in late).astimezone():%Y-%m-%d %H:%M}"
+            )
+            late_ids = {id(entry) for entry in late}
+            return [entry for entry in batch if id(entry) not in late_ids]
 
-                # 更新任务队列
-                for i, (time, task_target) in enumerate(self.task_queue):
-                    if self.normalize_session_id(task_target) == normalized_target:
-                        self.task_queue[i] = (next_time, task_target)
-                        heapq.heapify(self.task_queue)
-                        break
-            except Exception as e:
-                logger.error(f"更新下一次执行时间失败: {str(e)}")
-                logger.error(traceback.format_exc())
-        except Exception as e:
-            logger.error(f"执行任务时出错: {str(e)}")
-            logger.error(traceback.format_exc())
+        CATCH_UP.inc("late_sent", amount=len(late))
+        logger.warning(f"补发 {len(late)} 个过期的定时任务")
+        return batch
 
     @scheduler_error_handler
     async def scheduled_task(self) -> None:
         """定时任务主循环"""
+        error_delay = 1.0
         while True:
             try:
                 # 如果任务队列为空，等待唤醒
@@ -183,33 +473,21 @@ class Scheduler:
                     await self.wakeup_event.wait()
                     continue
 
-                # 获取下一个任务
-                next_time, target = self.task_queue[0]
-
-                # 计算等待时间
-                now = datetime.now()
-                if next_time > now:
-                    wait_seconds = (next_time - now).total_seconds()
+                # 获取下一个任务，等待到期；被唤醒时重新计算任务
+                next_time, target = self.task_queue.peek()
+                if await self._wait_until(next_time):
+                    continue
 
-                    # 设置唤醒事件的超时
+                # 取出所有已到期的任务，按补发策略处理后作为一批统一发送
+                now = utc_now()
+                batch = self._apply_catch_up(self.task_queue.pop_due(now), now)
+                if batch:
+                    self._running_batch_time = min(entry[0] for entry in batch)
                     try:
-                        # 等待唤醒事件或超时
-                        await asyncio.wait_for(
-                            self.wakeup_event.wait(), timeout=wait_seconds
-                        )
-
-                        # 如果被唤醒，重新计算任务
-                        self.wakeup_event.clear()
-                        continue
-                    except asyncio.TimeoutError:
-                        # 超时，执行任务
-                        pass
-
-                # 弹出当前任务
-                next_time, target = heapq.heappop(self.task_queue)
-
-                # 执行任务
-                await self._execute_task(target, next_time)
+                        await self._execute_batch(batch)
+                    finally:
+                        self._running_batch_time = None
+                error_delay = 1.0
 
             except asyncio.CancelledError:
                 # 任务被取消
@@ -218,8 +496,76 @@ class Scheduler:
             except Exception as e:
                 logger.error(f"定时任务循环出错: {str(e)}")
                 logger.error(traceback.format_exc())
-                # 出错后等待一段时间再继续
-                await asyncio.sleep(60)
+                # 出错后退避等待再继续，连续出错时逐步延长，最长60秒
+                await asyncio.sleep(error_delay)
+                error_delay = min(error_delay * 2, 60.0)
+
+    async def _wait_prefetch_event(self, timeout: Optional[float]) -> None:
+        """等待预取唤醒事件或超时"""
+        try:
+            await asyncio.wait_for(self.prefetch_event.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+        self.prefetch_event.clear()
+
+    async def _prefetch_image(self, send_time: datetime) -> bool:
+        """预取当天图片，失败时按指数退避重试，直到发送时间前
+
+        Returns:
+            bool: 是否预取成功
+        """
+        for attempt in range(self.prefetch_max_retries):
+            image_path = await self.image_manager.get_moyu_image()
+            if image_path and await self.image_manager.has_cached_image():
+                logger.info(
+                    f"已预取摸鱼人日历图片，用于 {send_time.astimezone():%Y-%m-%d %H:%M} 的定时发送"
+                )
+                return True
+
+            delay = self.prefetch_retry_backoff * (2**attempt)
+            if utc_now() + timedelta(seconds=delay) >= send_time:
+                break
+            logger.warning(
+                f"预取摸鱼人日历图片失败（第{attempt+1}次），{delay}秒后重试"
+            )
+            await asyncio.sleep(delay)
+
+        logger.error(
+            f"预取摸鱼人日历图片失败，{send_time.astimezone():%Y-%m-%d %H:%M} 的定时发送可能无法获取图片，"
+            f"请检查API状态（/api_status）"
+        )
+        return False
+
+    @scheduler_error_handler
+    async def prefetch_loop(self) -> None:
+        """预取主循环，在最早的定时任务前prefetch_lead_time秒下载当天图片"""
+        while True:
+            if not self.task_queue:
+                await self._wait_prefetch_event(None)
+                continue
+
+            next_time, _ = self.task_queue.peek()
+            now = utc_now()
+            # 图片缓存按本机日期失效，预取按本机时区的日期计算
+            local_next = next_time.astimezone()
+
+            # 当天已预取过，等待该任务执行后再计算下一次
+            if self._prefetched_date == local_next.date():
+                wait_seconds = max((next_time - now).total_seconds(), 0) + 1
+                await self._wait_prefetch_event(wait_seconds)
+                continue
+
+            # 图片缓存按日期失效，因此预取时间不早于发送当天的零点
+            day_start = local_next.replace(hour=0, minute=0, second=0, microsecond=0)
+            prefetch_at = max(
+                next_time - timedelta(seconds=self.prefetch_lead_time), day_start
+            )
+            if prefetch_at > now:
+                await self._wait_prefetch_event((prefetch_at - now).total_seconds())
+                continue
+
+            await self._prefetch_image(next_time)
+            self._prefetched_date = local_next.date()
 
     def start(self) -> None:
         """启动定时任务"""
@@ -232,11 +578,29 @@ class Scheduler:
         else:
             logger.info("定时任务已经在运行中")
 
+        # 只有开启图片缓存时预取才有意义
+        if (
+            not self.prefetch_task_ref
+            and self.prefetch_lead_time > 0
+            and self.image_manager.cache_enabled
+        ):
+            self.prefetch_task_ref = asyncio.get_event_loop().create_task(
+                self.prefetch_loop()
+            )
+            logger.info(f"图片预取已启动，提前 {self.prefetch_lead_time} 秒预取")
+
     async def stop(self) -> None:
         """停止定时任务"""
+        # 在取消前计算检查点，正在执行的批次与队列中到期的任务重启后仍会补发
+        checkpoint = self._checkpoint_time(utc_now())
         if self.scheduled_task_ref:
             self.scheduled_task_ref.cancel()
             self.scheduled_task_ref = None
+        if self.prefetch_task_ref:
+            self.prefetch_task_ref.cancel()
+            self.prefetch_task_ref = None
+        if self.ledger is not None:
+            await self.ledger.close(checkpoint)
 
     def remove_task(self, target: str) -> bool:
         """从任务队列中删除特定目标的任务
@@ -248,29 +612,14 @@ class Scheduler:
             bool: 是否成功删除任务
         """
         try:
-            # 标准化目标ID
+            self._rules.pop(target, None)
+            removed = self.task_queue.remove(target)
+            # 兼容以标准化ID加入队列的任务
             normalized_target = self.normalize_session_id(target)
-
-            # 创建新的任务队列，排除指定目标的任务
-            new_queue = []
-            removed = False
-
-            # 遍历当前任务队列
-            while self.task_queue:
-                task = heapq.heappop(self.task_queue)
-                time, task_target = task
-
-                # 如果不是要删除的目标，则保留
-                if self.normalize_session_id(task_target) != normalized_target:
-                    new_queue.append(task)
-                else:
-                    removed = True
-
-            # 重建任务队列
-            self.task_queue = []
-            for task in new_queue:
-                heapq.heappush(self.task_queue, task)
-
+            if normalized_target != target:
+                removed = self.task_queue.remove(normalized_target) or removed
+            if removed:
+                self.prefetch_event.set()
             return removed
         except Exception as e:
             logger.error(f"删除任务时出错: {str(e)}")
@@ -279,46 +628,4 @@ class Scheduler:
 
     async def _send_scheduled_message(self, session_id: str) -> None:
         """发送定时消息"""
-        try:
-            # 获取摸鱼图片
-            image_path = await self.image_manager.get_moyu_image()
-            if not image_path:
-                logger.error(f"获取摸鱼图片失败，跳过定时发送")
-                return
-
-            # 获取当前时间
-            current_time = datetime.now().strftime("%Y-%m-%d %H:%M")
-
-            # 获取随机模板
-            template = self.image_manager._get_next_template()
-
-            # 确保模板是字典类型并包含必要的键
-            if not isinstance(template, dict) or "format" not in template:
-                logger.error(f"定时任务 - 模板格式不正确")
-                template = self.image_manager.default_template
-
-            try:
-                # 格式化文本
-                text = template["format"].format(time=current_time)
-                logger.info(f"定时任务使用模板: {template.get('name', '未命名模板')}")
-            except Exception as e:
-                logger.error(f"定时任务 - 格式化模板时出错: {str(e)}")
-                # 使用一个简单的格式作为后备
-                text = f"摸鱼人日历\n当前时间：{current_time}"
-
-            # 创建消息
-            from astrbot.api.message_components import Plain, Image
-
-            message_segments = [Plain(text), Image(file=image_path)]
-
-            # 发送消息
-            from astrbot.api.event import MessageChain
-
-            message_chain = MessageChain(message_segments)
-            await self.context.send_message(session_id, message_chain)
-
-            logger.info(f"已向 {session_id} 发送摸鱼人日历")
-
-        except Exception as e:
-            logger.error(f"发送定时消息失败: {str(e)}")
-            logger.error(traceback.format_exc())
+        await self.delivery.deliver(session_id)
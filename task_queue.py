@@ -0,0 +1,207 @@
+import heapq
+import itertools
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+
+
+_EPOCH_ORDINAL = datetime(1970, 1, 1).toordinal()
+
+
+def epoch_minute(when: datetime) -> int:
+    """将时间换算为自1970-01-01起的分钟数，无时区的时间按墙上时间换算"""
+    if when.tzinfo is not None:
+        return int(when.timestamp() // 60)
+    return (when.toordinal() - _EPOCH_ORDINAL) * 1440 + when.hour * 60 + when.minute
+
+
+class IndexedTaskQueue:
+    """按目标索引的定时任务优先队列
+
+    底层为最小堆，另用字典记录每个目标当前有效的堆条目。重新调度或删除
+    目标时只作废旧条目（惰性删除），由出队时跳过，因此添加、重新调度和
+    删除都是 O(log n)。作废条目过多时整体压缩一次。
+    """
+
+    def __init__(self):
+        # 堆条目为 [执行时间, 序号, 目标]，序号保证同一时间按加入顺序出队
+        self._heap: List[list] = []
+        self._entries: Dict[str, list] = {}
+        self._counter = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __bool__(self) -> bool:
+        return bool(self._entries)
+
+    def __contains__(self, target: str) -> bool:
+        return target in self._entries
+
+    def get(self, target: str) -> Optional[datetime]:
+        """获取目标的下一次执行时间"""
+        entry = self._entries.get(target)
+        return entry[0] if entry else None
+
+    def push(self, target: str, when: datetime) -> None:
+        """添加目标，已存在时重新调度到新的时间"""
+        old = self._entries.get(target)
+        if old is not None:
+            if old[0] == when:
+                return
+            old[2] = None  # 作废旧条目
+        entry = [when, next(self._counter), target]
+        self._entries[target] = entry
+        heapq.heappush(self._heap, entry)
+        self._maybe_compact()
+
+    def remove(self, target: str) -> bool:
+        """删除目标的任务
+
+        Returns:
+            bool: 是否存在并删除了任务
+        """
+        entry = self._entries.pop(target, None)
+        if entry is None:
+            return False
+        entry[2] = None
+        self._maybe_compact()
+        return True
+
+    def _discard_stale(self) -> None:
+        """弹出堆顶已作废的条目"""
+        while self._heap and self._heap[0][2] is None:
+            heapq.heappop(self._heap)
+
+    def peek(self) -> Optional[Tuple[datetime, str]]:
+        """查看最早的任务，不出队"""
+        self._discard_stale()
+        if not self._heap:
+            return None
+        when, _, target = self._heap[0]
+        return when, target
+
+    def pop_due(self, now: datetime) -> List[Tuple[datetime, str]]:
+        """取出所有执行时间不晚于now的任务"""
+        due = []
+        while True:
+            self._discard_stale()
+            if not self._heap or self._heap[0][0] > now:
+                break
+            when, _, target = heapq.heappop(self._heap)
+            del self._entries[target]
+            due.append((when, target))
+        return due
+
+    def clear(self) -> None:
+        """清空队列"""
+        self._heap = []
+        self._entries = {}
+
+    def _maybe_compact(self) -> None:
+        """作废条目超过有效条目时重建堆，限制内存占用"""
+        if len(self._heap) > 2 * len(self._entries) + 64:
+            self._heap = [entry for entry in self._heap if entry[2] is not None]
+            heapq.heapify(self._heap)
+
+
+class MinuteBucketQueue:
+    """按分钟分桶的定时任务队列（时间轮）
+
+    发送时间只精确到分钟，因此把一天分成1440个槽位，每个槽位按绝对分钟
+    保存一组目标。注册和删除是 O(1)；调度器每个非空分钟只唤醒一次，
+    出队代价与该分钟的目标数成正比。与 IndexedTaskQueue 接口一致。
+    """
+
+    SLOTS = 1440
+
+    def __init__(self):
+        # 每个槽位：绝对分钟 -> 目标集合；同一槽位可能有不同日期的分钟
+        self._slots: List[Dict[int, Set[str]]] = [{} for _ in range(self.SLOTS)]
+        self._when: Dict[str, datetime] = {}
+        self._minute: Dict[str, int] = {}
+        # 不早于该分钟之前没有任务，用于加速查找
+        self._cursor: Optional[int] = None
+
+    def __len__(self) -> int:
+        return len(self._when)
+
+    def __bool__(self) -> bool:
+        return bool(self._when)
+
+    def __contains__(self, target: str) -> bool:
+        return target in self._when
+
+    def get(self, target: str) -> Optional[datetime]:
+        """获取目标的下一次执行时间"""
+        return self._when.get(target)
+
+    def push(self, target: str, when: datetime) -> None:
+        """添加目标，已存在时重新调度到新的时间"""
+        if target in self._minute:
+            self.remove(target)
+        minute = epoch_minute(when)
+        self._slots[minute % self.SLOTS].setdefault(minute, set()).add(target)
+        self._when[target] = when
+        self._minute[target] = minute
+        if self._cursor is None or minute < self._cursor:
+            self._cursor = minute
+
+    def remove(self, target: str) -> bool:
+        """删除目标的任务
+
+        Returns:
+            bool: 是否存在并删除了任务
+        """
+        minute = self._minute.pop(target, None)
+        if minute is None:
+            return False
+        del self._when[target]
+        slot = self._slots[minute % self.SLOTS]
+        bucket = slot[minute]
+        bucket.discard(target)
+        if not bucket:
+            del slot[minute]
+        return True
+
+    def _first_minute(self) -> Optional[int]:
+        """查找最早的非空分钟，并把游标移动到该分钟"""
+        if not self._when:
+            self._cursor = None
+            return None
+        # 先在游标之后的一整圈槽位中查找，超过一天的任务再全量查找
+        for minute in range(self._cursor, self._cursor + self.SLOTS):
+            if minute in self._slots[minute % self.SLOTS]:
+                self._cursor = minute
+                return minute
+        self._cursor = min(self._minute.values())
+        return self._cursor
+
+    def peek(self) -> Optional[Tuple[datetime, str]]:
+        """查看最早的任务，不出队"""
+        minute = self._first_minute()
+        if minute is None:
+            return None
+        target = next(iter(self._slots[minute % self.SLOTS][minute]))
+        return self._when[target], target
+
+    def pop_due(self, now: datetime) -> List[Tuple[datetime, str]]:
+        """取出所有执行时间不晚于now的任务"""
+        due = []
+        now_minute = epoch_minute(now)
+        while True:
+            minute = self._first_minute()
+            if minute is None or minute > now_minute:
+                break
+            for target in self._slots[minute % self.SLOTS].pop(minute):
+                due.append((self._when.pop(target), target))
+                del self._minute[target]
+        due.sort(key=lambda item: item[0])
+        return due
+
+    def clear(self) -> None:
+        """清空队列"""
+        for slot in self._slots:
+            slot.clear()
+        self._when = {}
+        self._minute = {}
+        self._cursor = None
@@ -0,0 +1,10 @@
+import os
+import sys
+import types
+
+# 插件目录本身是一个包（由AstrBot按目录加载），测试中以 moyuren 包名导入
+PLUGIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if "moyuren" not in sys.modules:
+    package = types.ModuleType("moyuren")
+    package.__path__ = [PLUGIN_DIR]
+    sys.modules["moyuren"] = package
@@ -0,0 +1,95 @@
+import json
+import os
+
+import pytest
+
+# 配置管理器依赖AstrBot运行时，未安装时跳过
+pytest.importorskip("astrbot")
+
+from moyuren.config_manager import ConfigManager  # noqa: E402
+
+
+def _journal_manager(tmp_path, **config) -> ConfigManager:
+    manager = ConfigManager(
+        str(tmp_path / "config.json"),
+        {"config_storage_mode": "journal", "config_save_debounce": 0, **config},
+    )
+    manager.load_config()
+    return manager
+
+
+def _read_json(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_journal_appends_records_and_replays_them_on_load(tmp_path):
+    manager = _journal_manager(tmp_path)
+    manager.update_settings("a", custom_time="09:00")
+    manager.update_settings("b", custom_time="10:30", trigger_word="划水")
+    manager.unset_settings("a", "custom_time")
+
+    # 修改只追加到日志，快照仍是首次加载时写入的空配置
+    assert _read_json(tmp_path / "config.json") == {}
+    with open(tmp_path / "config.json.journal", "r", encoding="utf-8") as f:
+        assert len(f.readlines()) == 3
+
+    reloaded = _journal_manager(tmp_path)
+    assert reloaded.group_settings == {
+        "a": {},
+        "b": {"custom_time": "10:30", "trigger_word": "划水"},
+    }
+
+
+def test_torn_journal_tail_is_ignored_and_compacted(tmp_path):
+    manager = _journal_manager(tmp_path)
+    manager.update_settings("a", custom_time="09:00")
+    manager.update_settings("b", custom_time="10:30")
+    # 模拟写入最后一条记录时崩溃
+    with open(tmp_path / "config.json.journal", "a", encoding="utf-8") as f:
+        f.write('{"op": "set", "target": "c", "fie')
+
+    reloaded = _journal_manager(tmp_path)
+    assert set(reloaded.group_settings) == {"a", "b"}
+    # 损坏的日志立即压缩为快照，后续记录不会追加在损坏的行后面
+    assert not os.path.exists(tmp_path / "config.json.journal")
+    assert _read_json(tmp_path / "config.json") == reloaded.group_settings
+
+
+def test_journal_is_compacted_at_threshold(tmp_path):
+    manager = _journal_manager(tmp_path, journal_compact_threshold=3)
+    manager.update_settings("a", custom_time="09:00")
+    manager.update_settings("b", custom_time="10:00")
+    assert os.path.exists(tmp_path / "config.json.journal")
+
+    manager.update_settings("c", custom_time="11:00")
+    assert not os.path.exists(tmp_path / "config.json.journal")
+    assert _read_json(tmp_path / "config.json") == manager.group_settings
+
+
+def test_settings_migrate_between_json_and_sqlite(tmp_path):
+    config_file = str(tmp_path / "config.json")
+    manager = ConfigManager(config_file, {"config_save_debounce": 0})
+    manager.load_config()
+    manager.update_settings("a", custom_time="09:00")
+    manager.update_settings("b", custom_time="10:30,18:00")
+    # 加载时会补全默认触发词
+    expected = {
+        "a": {"custom_time": "09:00", "trigger_word": "摸鱼"},
+        "b": {"custom_time": "10:30,18:00", "trigger_word": "摸鱼"},
+    }
+
+    sqlite_manager = ConfigManager(
+        config_file, {"config_storage_mode": "sqlite", "config_save_debounce": 0}
+    )
+    sqlite_manager.load_config()
+    sqlite_manager.storage.close()
+    assert sqlite_manager.group_settings == expected
+    assert not os.path.exists(config_file)
+
+    # 切换回JSON时从数据库迁移，而不是以空配置启动
+    json_manager = ConfigManager(config_file, {"config_storage_mode": "journal"})
+    json_manager.load_config()
+    assert json_manager.group_settings == expected
+    assert _read_json(config_file) == expected
+    assert not os.path.exists(tmp_path / "config.db")
@@ -0,0 +1,92 @@
+import asyncio
+from datetime import timedelta
+
+import pytest
+
+# 调度器依赖AstrBot运行时，未安装时跳过
+pytest.importorskip("astrbot")
+
+from moyuren.delivery_ledger import DeliveryLedger  # noqa: E402
+from moyuren.scheduler import Scheduler  # noqa: E402
+from moyuren.timezones import utc_now  # noqa: E402
+
+
+class _ConfigManager:
+    def __init__(self, group_settings):
+        self.group_settings = group_settings
+
+
+class _Delivery:
+    def __init__(self):
+        self.sent = []
+
+    async def deliver_many(self, targets, now):
+        self.sent.extend(targets)
+        return {
+            "targets": len(targets),
+            "sent": len(targets),
+            "failed": 0,
+            "skew_seconds": 0.0,
+            "delivered": list(targets),
+        }
+
+
+def _make_scheduler(settings, ledger_file):
+    ledger = DeliveryLedger(ledger_file)
+    ledger.load()
+    scheduler = Scheduler(
+        _ConfigManager(settings), None, None, {}, delivery=_Delivery(), ledger=ledger
+    )
+    return scheduler, ledger
+
+
+def test_restart_replays_due_sends_but_not_done_or_ambiguous_ones(tmp_path):
+    """停止时仍在队列中的到期发送在重启后补发，已完成和发送中的不重发"""
+    ledger_file = str(tmp_path / "delivery_ledger.json")
+    now = utc_now().replace(second=0, microsecond=0)
+    due = now - timedelta(minutes=1)
+    slot = f"{due.astimezone():%H:%M}"
+    settings = {
+        "aiocqhttp:GroupMessage:pending": {"custom_time": slot},
+        "aiocqhttp:GroupMessage:done": {"custom_time": slot},
+        "aiocqhttp:GroupMessage:sending": {"custom_time": slot},
+    }
+
+    async def run():
+        scheduler, ledger = _make_scheduler(settings, ledger_file)
+        await ledger.update_checkpoint(due - timedelta(minutes=10))
+        key = lambda target: scheduler._ledger_key(target, due, None)  # noqa: E731
+        await ledger.mark([key("aiocqhttp:GroupMessage:done")], DeliveryLedger.DONE)
+        await ledger.mark([key("aiocqhttp:GroupMessage:sending")], DeliveryLedger.SENDING)
+        # 到期但尚未执行时插件停止
+        scheduler.task_queue.push("aiocqhttp:GroupMessage:pending", due)
+        await scheduler.stop()
+        assert ledger.checkpoint <= due
+
+        restarted, _ = _make_scheduler(settings, ledger_file)
+        restarted.update_task_queue()
+        batch = restarted.task_queue.pop_due(utc_now())
+        assert batch == [(due, "aiocqhttp:GroupMessage:pending")]
+        await restarted._execute_batch(batch)
+        await restarted.stop()
+        return restarted
+
+    restarted = asyncio.run(run())
+    assert restarted.delivery.sent == ["aiocqhttp:GroupMessage:pending"]
+
+    # 补发完成后再次重启不会重复发送
+    again, _ = _make_scheduler(settings, ledger_file)
+    again.update_task_queue()
+    assert again.task_queue.pop_due(utc_now()) == []
+
+
+def test_checkpoint_does_not_pass_queued_or_running_sends(tmp_path):
+    scheduler, _ = _make_scheduler({}, str(tmp_path / "delivery_ledger.json"))
+    now = utc_now()
+    assert scheduler._checkpoint_time(now) == now
+
+    scheduler.task_queue.push("a", now - timedelta(minutes=2))
+    assert scheduler._checkpoint_time(now) == now - timedelta(minutes=2)
+
+    scheduler._running_batch_time = now - timedelta(minutes=5)
+    assert scheduler._checkpoint_time(now) == now - timedelta(minutes=5)
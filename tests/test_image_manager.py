@@ -0,0 +1,54 @@
+import asyncio
+import hashlib
+import os
+
+import pytest
+
+# 图片管理器依赖AstrBot运行时，未安装时跳过
+pytest.importorskip("astrbot")
+
+from moyuren.image_manager import ImageManager  # noqa: E402
+
+ENDPOINTS = ["https://a.example/moyu", "https://b.example/moyu"]
+CONTENT = b"\xff\xd8" + b"moyu" * 1000
+
+
+def _make_manager(tmp_path) -> ImageManager:
+    return ImageManager(
+        str(tmp_path / "image_cache"),
+        {"api_endpoints": ENDPOINTS, "hedge_delay": 0.01},
+    )
+
+
+async def _commit_content(manager: ImageManager) -> str:
+    temp_path = manager.image_store.new_temp_path()
+    with open(temp_path, "wb") as f:
+        f.write(CONTENT)
+    return await manager.image_store.commit(
+        temp_path, hashlib.sha256(CONTENT).hexdigest(), "jpg"
+    )
+
+
+def test_hedged_fetch_keeps_shared_file_when_endpoints_finish_together(tmp_path):
+    """两个端点在同一轮返回相同图片时，胜出的图片文件不会被删除"""
+
+    async def run():
+        manager = _make_manager(tmp_path)
+        gate = asyncio.Event()
+
+        async def fake_try_endpoint(idx, api_url):
+            # 第二个端点启动时放行两个请求，使它们在同一轮完成
+            if idx == 1:
+                gate.set()
+            await gate.wait()
+            path = await _commit_content(manager)
+            return api_url, path, CONTENT
+
+        manager._try_endpoint = fake_try_endpoint
+        path = await manager.get_moyu_image()
+        return manager, path
+
+    manager, path = asyncio.run(run())
+    assert path is not None
+    assert os.path.exists(path)
+    assert manager.image_store.stats() == {"files": 1, "bytes": len(CONTENT)}
@@ -0,0 +1,108 @@
+import json
+from datetime import date, datetime, timezone
+
+import pytest
+
+# 发送规则依赖AstrBot运行时，未安装时跳过
+pytest.importorskip("astrbot")
+
+from moyuren.schedule_rules import HolidayCalendar, ScheduleRule  # noqa: E402
+from moyuren.timezones import get_zone  # noqa: E402
+
+NEW_YORK = get_zone("America/New_York")
+SHANGHAI = get_zone("Asia/Shanghai")
+
+
+def utc(*args) -> datetime:
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+def daily(times: str, zone=NEW_YORK, **kwargs) -> ScheduleRule:
+    return ScheduleRule(ScheduleRule.parse_times(times), zone=zone, **kwargs)
+
+
+def test_next_after_keeps_local_time_across_dst_switch():
+    rule = daily("09:00")
+    # 切换前一天为 EST（UTC-5），切换当天起为 EDT（UTC-4）
+    assert rule.next_after(utc(2025, 3, 8, 12, 0)) == utc(2025, 3, 8, 14, 0)
+    assert rule.next_after(utc(2025, 3, 8, 14, 0)) == utc(2025, 3, 9, 13, 0)
+
+
+def test_next_after_resolves_the_spring_forward_gap():
+    rule = daily("02:30")
+    # 不存在的 02:30 顺延为 03:30 EDT，之后回到每天的 02:30
+    assert rule.next_after(utc(2025, 3, 9, 5, 0)) == utc(2025, 3, 9, 7, 30)
+    assert rule.next_after(utc(2025, 3, 9, 7, 30)) == utc(2025, 3, 10, 6, 30)
+
+
+def test_next_after_sends_once_during_the_fall_back_fold():
+    rule = daily("01:30")
+    first = rule.next_after(utc(2025, 11, 2, 4, 0))
+    assert first == utc(2025, 11, 2, 5, 30)
+    # 重复出现的第二个 01:30（EST）不再发送
+    assert rule.next_after(first) == utc(2025, 11, 3, 6, 30)
+
+
+def test_parse_times_sorts_and_deduplicates():
+    assert ScheduleRule.parse_times("18:00，09:30, 09:30") == [(9, 30), (18, 0)]
+    assert ScheduleRule.format_times([(9, 30), (18, 0)]) == "09:30,18:00"
+    with pytest.raises(ValueError):
+        ScheduleRule.parse_times("24:00")
+    with pytest.raises(ValueError):
+        ScheduleRule.parse_times(" , ")
+
+
+def test_parse_weekdays():
+    assert ScheduleRule.parse_weekdays(None) == (None, False)
+    assert ScheduleRule.parse_weekdays("daily") == (None, False)
+    assert ScheduleRule.parse_weekdays("workday") == (frozenset(range(1, 6)), True)
+    assert ScheduleRule.parse_weekdays("1-3,6") == (frozenset({1, 2, 3, 6}), False)
+    with pytest.raises(ValueError):
+        ScheduleRule.parse_weekdays("0-8")
+
+
+def test_next_after_walks_times_then_weekdays():
+    weekdays, workday = ScheduleRule.parse_weekdays("1,3")
+    rule = ScheduleRule(
+        ScheduleRule.parse_times("09:00,18:00"), weekdays, workday, SHANGHAI
+    )
+    # 2025-06-02 为周一，北京时间为 UTC+8
+    assert rule.next_after(utc(2025, 6, 2, 0, 0)) == utc(2025, 6, 2, 1, 0)
+    assert rule.next_after(utc(2025, 6, 2, 1, 0)) == utc(2025, 6, 2, 10, 0)
+    # 周二不发送，下一次是周三早上
+    assert rule.next_after(utc(2025, 6, 2, 10, 0)) == utc(2025, 6, 4, 1, 0)
+
+
+def test_holiday_calendar_rules(tmp_path):
+    calendar_file = tmp_path / "holidays.json"
+    calendar_file.write_text(
+        json.dumps({"holidays": ["2025-10-01", "2025-10-02"], "workdays": ["2025-09-28"]}),
+        encoding="utf-8",
+    )
+    calendar = HolidayCalendar.load(str(calendar_file))
+    weekdays, workday = ScheduleRule.parse_weekdays("workday")
+    rule = ScheduleRule([(9, 0)], weekdays, workday, SHANGHAI, calendar)
+
+    # 节假日不发送，调休的周日按工作日发送
+    assert not rule.runs_on(date(2025, 10, 1))
+    assert rule.runs_on(date(2025, 9, 28))
+    assert rule.runs_on(date(2025, 9, 30))
+    assert rule.next_after(utc(2025, 9, 30, 2, 0)) == utc(2025, 10, 3, 1, 0)
+
+    # 自定义星期只跳过节假日，调休日仍按星期判断
+    custom = ScheduleRule([(9, 0)], frozenset({3, 7}), False, SHANGHAI, calendar)
+    assert not custom.runs_on(date(2025, 10, 1))
+    assert custom.runs_on(date(2025, 9, 28))
+    assert not ScheduleRule([(9, 0)], frozenset({2}), False, SHANGHAI, calendar).runs_on(
+        date(2025, 9, 28)
+    )
+
+    # 每天发送的规则不受日历影响
+    assert ScheduleRule([(9, 0)], None, False, SHANGHAI, calendar).runs_on(date(2025, 10, 1))
+
+
+def test_holiday_calendar_rejects_invalid_files(tmp_path):
+    calendar_file = tmp_path / "holidays.json"
+    calendar_file.write_text("[]", encoding="utf-8")
+    with pytest.raises(ValueError):
+        HolidayCalendar.load(str(calendar_file))
@@ -0,0 +1,101 @@
+import random
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from moyuren.task_queue import IndexedTaskQueue, MinuteBucketQueue
+
+BASE = datetime(2025, 3, 1, 9, 0, tzinfo=timezone.utc)
+
+
+def at(minutes: int) -> datetime:
+    return BASE + timedelta(minutes=minutes)
+
+
+def test_pop_due_returns_due_tasks_in_time_order():
+    queue = IndexedTaskQueue()
+    queue.push("c", at(2))
+    queue.push("a", at(0))
+    queue.push("b", at(1))
+    queue.push("d", at(5))
+
+    assert queue.pop_due(at(2)) == [(at(0), "a"), (at(1), "b"), (at(2), "c")]
+    assert len(queue) == 1
+    assert queue.peek() == (at(5), "d")
+
+
+def test_reschedule_replaces_the_previous_entry():
+    queue = IndexedTaskQueue()
+    queue.push("a", at(0))
+    queue.push("b", at(1))
+    queue.push("a", at(3))
+
+    assert len(queue) == 2
+    assert queue.get("a") == at(3)
+    assert queue.peek() == (at(1), "b")
+    assert queue.pop_due(at(10)) == [(at(1), "b"), (at(3), "a")]
+
+
+def test_remove_skips_the_stale_entry():
+    queue = IndexedTaskQueue()
+    queue.push("a", at(0))
+    queue.push("b", at(1))
+
+    assert queue.remove("a") is True
+    assert queue.remove("a") is False
+    assert "a" not in queue
+    assert queue.peek() == (at(1), "b")
+    assert queue.pop_due(at(10)) == [(at(1), "b")]
+    assert not queue
+
+
+def test_repeated_reschedules_compact_the_heap():
+    queue = IndexedTaskQueue()
+    for minute in range(1000):
+        queue.push("a", at(minute))
+
+    assert len(queue) == 1
+    assert len(queue._heap) <= 2 * len(queue) + 64
+    assert queue.pop_due(at(1000)) == [(at(999), "a")]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_minute_bucket_queue_matches_indexed_queue(seed):
+    """随机的添加、重新调度、删除与出队操作下，两种队列的结果一致"""
+    rng = random.Random(seed)
+    heap, wheel = IndexedTaskQueue(), MinuteBucketQueue()
+    targets = [f"group{i}" for i in range(50)]
+    now = 0
+
+    for _ in range(2000):
+        op = rng.random()
+        target = rng.choice(targets)
+        if op < 0.6:
+            # 包括跨越一整天以上的任务，覆盖时间轮的同槽位不同日期
+            when = at(now + rng.randint(0, 3 * 1440))
+            heap.push(target, when)
+            wheel.push(target, when)
+        elif op < 0.8:
+            assert heap.remove(target) == wheel.remove(target)
+        else:
+            now += rng.randint(0, 720)
+            heap_due = heap.pop_due(at(now))
+            wheel_due = wheel.pop_due(at(now))
+            assert sorted(heap_due) == sorted(wheel_due)
+            assert [when for when, _ in wheel_due] == sorted(when for when, _ in wheel_due)
+
+        assert len(heap) == len(wheel)
+        assert heap.get(target) == wheel.get(target)
+        heap_next, wheel_next = heap.peek(), wheel.peek()
+        assert (heap_next and heap_next[0]) == (wheel_next and wheel_next[0])
+
+
+def test_minute_bucket_queue_clear():
+    queue = MinuteBucketQueue()
+    queue.push("a", at(0))
+    queue.push("b", at(1440))
+    queue.clear()
+
+    assert not queue
+    assert queue.peek() is None
+    assert queue.pop_due(at(3000)) == []
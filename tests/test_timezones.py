@@ -0,0 +1,38 @@
+from datetime import date, datetime, timezone
+
+import pytest
+
+from moyuren.timezones import get_zone, local_to_utc, to_local
+
+NEW_YORK = get_zone("America/New_York")
+
+
+def test_local_to_utc_in_standard_and_daylight_time():
+    assert local_to_utc(date(2025, 1, 15), 9, 0, NEW_YORK) == datetime(
+        2025, 1, 15, 14, 0, tzinfo=timezone.utc
+    )
+    assert local_to_utc(date(2025, 7, 15), 9, 0, NEW_YORK) == datetime(
+        2025, 7, 15, 13, 0, tzinfo=timezone.utc
+    )
+
+
+def test_spring_forward_gap_moves_to_the_same_offset_after_the_switch():
+    # 2025-03-09 02:00 EST 拨快到 03:00 EDT，02:30 不存在，顺延为 03:30 EDT
+    when = local_to_utc(date(2025, 3, 9), 2, 30, NEW_YORK)
+    assert when == datetime(2025, 3, 9, 7, 30, tzinfo=timezone.utc)
+    local = to_local(when, NEW_YORK)
+    assert (local.hour, local.minute) == (3, 30)
+    assert local.utcoffset().total_seconds() == -4 * 3600
+
+
+def test_fall_back_fold_uses_the_first_occurrence():
+    # 2025-11-02 01:30 出现两次（EDT 与 EST），取第一次
+    when = local_to_utc(date(2025, 11, 2), 1, 30, NEW_YORK)
+    assert when == datetime(2025, 11, 2, 5, 30, tzinfo=timezone.utc)
+
+
+def test_get_zone():
+    assert get_zone("") is None
+    assert get_zone("Asia/Shanghai") is get_zone("Asia/Shanghai")
+    with pytest.raises(ValueError):
+        get_zone("Mars/Olympus_Mons")
@@ -0,0 +1,45 @@
+from datetime import date, datetime, time, timezone, tzinfo
+from functools import lru_cache
+from typing import Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+
+@lru_cache(maxsize=None)
+def get_zone(name: Optional[str]) -> Optional[tzinfo]:
+    """按IANA名称解析时区，名称为空时返回None，表示使用系统本地时区
+
+    Raises:
+        ValueError: 时区名称无效
+    """
+    if not name:
+        return None
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValueError(
+            f"未知的时区: {name}，请使用如 Asia/Shanghai 的IANA时区名称"
+            f"（Windows 上需要安装 tzdata）"
+        )
+
+
+def utc_now() -> datetime:
+    """当前的UTC时间（带时区）"""
+    return datetime.now(timezone.utc)
+
+
+def to_local(when: datetime, zone: Optional[tzinfo]) -> datetime:
+    """把带时区的时间换算到指定时区，zone为None时换算到系统本地时区"""
+    return when.astimezone(zone) if zone is not None else when.astimezone()
+
+
+def local_to_utc(day: date, hour: int, minute: int, zone: Optional[tzinfo]) -> datetime:
+    """把某个时区的本地日期和时刻换算为UTC时间
+
+    夏令时切换时：本地时刻重复出现（回拨）取第一次出现；本地时刻不存在
+    （拨快）按切换前的偏移换算，即顺延到切换后的对应时刻。
+    """
+    local = datetime.combine(day, time(hour, minute))
+    if zone is None:
+        # 无时区的时间按系统本地时区解释，由系统规则处理夏令时
+        return local.astimezone(timezone.utc)
+    return local.replace(tzinfo=zone).astimezone(timezone.utc)
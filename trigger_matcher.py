@@ -0,0 +1,90 @@
+import re
+from typing import List, Optional
+
+
+class TriggerMatcher:
+    """预编译的触发词匹配器
+
+    触发词设置中可以用 | 分隔多个触发词，支持以下匹配模式：
+    - contains：消息中包含任意触发词（默认）
+    - word：触发词作为完整的词出现，前后不能紧跟文字或数字
+    - prefix：消息以任意触发词开头
+    - regex：触发词为正则表达式，| 按正则的“或”处理
+
+    匹配器在触发词变化时构建一次，之后每条消息只做一次匹配调用。
+    """
+
+    MODES = ("contains", "word", "prefix", "regex")
+    DEFAULT_MODE = "contains"
+
+    __slots__ = ("trigger", "mode", "words", "_single", "_prefixes", "_pattern")
+
+    def __init__(self, trigger: str, mode: str = DEFAULT_MODE):
+        """构建匹配器
+
+        Args:
+            trigger: 触发词设置，多个触发词用 | 分隔
+            mode: 匹配模式
+
+        Raises:
+            ValueError: 匹配模式未知、没有有效触发词或正则表达式无效
+        """
+        if mode not in self.MODES:
+            raise ValueError(f"未知的匹配模式: {mode}，可选: {'/'.join(self.MODES)}")
+
+        self.trigger = trigger
+        self.mode = mode
+        self.words = self.split_words(trigger) if mode != "regex" else [trigger]
+        if not self.words or not self.words[0]:
+            raise ValueError("触发词不能为空")
+
+        self._single: Optional[str] = None
+        self._prefixes: Optional[tuple] = None
+        self._pattern: Optional[re.Pattern] = None
+
+        if mode == "contains" and len(self.words) == 1:
+            # 单个触发词直接用子串查找，比正则更快
+            self._single = self.words[0]
+        elif mode == "prefix":
+            self._prefixes = tuple(self.words)
+        elif mode == "regex":
+            try:
+                self._pattern = re.compile(trigger)
+            except re.error as e:
+                raise ValueError(f"无效的正则表达式: {str(e)}")
+        else:
+            # 长的触发词优先，避免被较短的前缀截断
+            alternation = "|".join(
+                re.escape(word) for word in sorted(self.words, key=len, reverse=True)
+            )
+            if mode == "word":
+                alternation = rf"(?<!\w)(?:{alternation})(?!\w)"
+            self._pattern = re.compile(alternation)
+
+    @staticmethod
+    def split_words(trigger: str) -> List[str]:
+        """按 | 拆分触发词并去除空白和重复项"""
+        words = []
+        for word in trigger.split("|"):
+            word = word.strip()
+            if word and word not in words:
+                words.append(word)
+        return words
+
+    def first_chars(self) -> Optional[frozenset]:
+        """命中时消息中必然出现的字符集合（各触发词的首字符）
+
+        Returns:
+            Optional[frozenset]: 正则模式无法确定时返回None
+        """
+        if self.mode == "regex":
+            return None
+        return frozenset(word[0] for word in self.words)
+
+    def match(self, text: str) -> bool:
+        """判断消息是否命中触发词"""
+        if self._single is not None:
+            return self._single in text
+        if self._prefixes is not None:
+            return text.startswith(self._prefixes)
+        return self._pattern.search(text) is not None